@@ -2,6 +2,7 @@ import streamlit as st
 from config import load_config
 from ui import (
     show_login_form, 
+    sidebar_chat_search,
     sidebar_session_selector, 
     show_pdf_manager_in_sidebar,
     sidebar_navigation,
@@ -9,12 +10,22 @@ from ui import (
     show_chat_page,
     show_quiz_page # Import the new quiz page function
 )
-from user_data import save_user_data_from_session, load_user_data_into_session
+from user_data import save_user_data_from_session, load_user_data_into_session, flush_user_data
+from run_timing import timed_run
+from metrics import start_metrics_server
+from warmup import start_warmup
 
 # --- Page Configuration ---
 # Set the page title and icon. This is the official way to name your Streamlit app.
 st.set_page_config(page_title="Dialogix", page_icon="🤖")
 
+# Serves Prometheus metrics when DIALOGIX_METRICS_PORT is set; a no-op on reruns.
+start_metrics_server()
+
+# Preloads models and MetaAI clients in the background, once per process, so the
+# first user after a deploy doesn't wait for them. The login page renders meanwhile.
+start_warmup()
+
 # --- Session State Initialization ---
 def initialize_session_state():
     """Initializes the basic session state variables if they don't exist."""
@@ -30,44 +41,50 @@ def initialize_session_state():
         st.session_state.page = "chat"
 
 # --- Main Application Logic ---
-initialize_session_state()
+# Each full script run is timed; compare with the fragment timings on the Settings page.
+with timed_run("full_run"):
+    initialize_session_state()
 
-# If the user is not logged in, show the login/registration form.
-if not st.session_state.logged_in:
-    st.markdown("<h1 style='text-align: center;'>Welcome to Dialogix 🤖</h1>", unsafe_allow_html=True)
-    st.markdown("<p style='text-align: center;'>Your intelligent E Learning chat companion.</p>", unsafe_allow_html=True)
-    show_login_form()
+    # If the user is not logged in, show the login/registration form.
+    if not st.session_state.logged_in:
+        st.markdown("<h1 style='text-align: center;'>Welcome to Dialogix 🤖</h1>", unsafe_allow_html=True)
+        st.markdown("<p style='text-align: center;'>Your intelligent E Learning chat companion.</p>", unsafe_allow_html=True)
+        show_login_form()
 
-# If the user is logged in, show the main application.
-else:
-    # Load user-specific data if it's not already in the session.
-    if 'chat_sessions' not in st.session_state:
-        load_user_data_into_session(st.session_state.username)
+    # If the user is logged in, show the main application.
+    else:
+        # Load user-specific data if it's not already in the session.
+        if 'chat_sessions' not in st.session_state:
+            load_user_data_into_session(st.session_state.username)
 
-    # --- Sidebar ---
-    st.sidebar.title("Dialogix")
-    st.sidebar.markdown(f"Welcome, **{st.session_state.username}**!")
+        # --- Sidebar ---
+        st.sidebar.title("Dialogix")
+        st.sidebar.markdown(f"Welcome, **{st.session_state.username}**!")
     
-    sidebar_session_selector()
-    show_pdf_manager_in_sidebar(st.session_state)
-    sidebar_navigation()
+        # These regions are fragments: interacting with them reruns only that region.
+        with st.sidebar:
+            sidebar_chat_search()
+            sidebar_session_selector()
+            show_pdf_manager_in_sidebar(st.session_state)
+        sidebar_navigation()
 
-    if st.sidebar.button("Logout", use_container_width=True):
-        save_user_data_from_session(st.session_state.username)
-        # Clear the session state upon logout
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        initialize_session_state()
-        st.rerun()
+        if st.sidebar.button("Logout", use_container_width=True):
+            save_user_data_from_session(st.session_state.username)
+            flush_user_data()
+            # Clear the session state upon logout
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            initialize_session_state()
+            st.rerun()
 
-    # --- Page Routing ---
-    if st.session_state.page == "settings":
-        show_settings_page(st.session_state)
+        # --- Page Routing ---
+        if st.session_state.page == "settings":
+            show_settings_page(st.session_state)
     
-    elif st.session_state.page == "quiz":
-        # Add routing for the new quiz page
-        show_quiz_page(st.session_state)
+        elif st.session_state.page == "quiz":
+            # Add routing for the new quiz page
+            show_quiz_page(st.session_state)
 
-    elif st.session_state.page == "chat":
-        # All chat page logic is now handled by this function from ui.py
-        show_chat_page(st.session_state)
\ No newline at end of file
+        elif st.session_state.page == "chat":
+            # All chat page logic is now handled by this function from ui.py
+            show_chat_page(st.session_state)
\ No newline at end of file
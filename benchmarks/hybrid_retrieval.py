@@ -0,0 +1,52 @@
+"""
+Answer hit rate and prompt size of dense vs. hybrid (BM25 + dense) retrieval.
+
+The questions file is a JSON list of {"query": ..., "expected": ...} objects, where
+"expected" is a phrase that must appear in the retrieved context for the query to
+count as answered (a formula name, a definition, a chapter title, ...):
+
+    python -m benchmarks.hybrid_retrieval notes.pdf questions.json --k 1 3 5 10 15
+"""
+
+import argparse
+import json
+import time
+
+from rag_retriever import RAGRetriever
+
+
+def evaluate(rag, questions, k, mode):
+    """Returns (hit rate, mean context characters, mean ms per query) for one mode and k."""
+    hits = 0
+    total_chars = 0
+    start = time.perf_counter()
+    for question in questions:
+        context = rag.retrieve_context(question["query"], k=k, mode=mode)
+        total_chars += len(context)
+        if question["expected"].lower() in context.lower():
+            hits += 1
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return hits / len(questions), total_chars / len(questions), elapsed_ms / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="PDF to index and query.")
+    parser.add_argument("questions", help="JSON file of {query, expected} objects.")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 8, 10, 15])
+    args = parser.parse_args()
+
+    with open(args.questions, "r") as f:
+        questions = json.load(f)
+
+    rag = RAGRetriever(args.pdf)
+    print(f"{len(questions)} questions against {args.pdf}")
+    print(f"{'mode':<8} {'k':>3} {'hit rate':>9} {'ctx chars':>10} {'ms/query':>9}")
+    for mode in ("dense", "hybrid"):
+        for k in args.k:
+            hit_rate, chars, ms = evaluate(rag, questions, k, mode)
+            print(f"{mode:<8} {k:>3} {hit_rate:>9.2%} {chars:>10.0f} {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
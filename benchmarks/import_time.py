@@ -0,0 +1,91 @@
+"""
+Cold-start import profile: what loads before the login form is interactive.
+
+Runs `python -X importtime` on the modules the app imports at startup in a fresh
+interpreter, and reports the total import time and the slowest packages. With
+--first-run it also times a fresh process rendering the first run of app.py
+(the login page) through streamlit.testing's AppTest.
+
+Run from the project root:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modules ui voice rag_retriever --top 15
+    python -m benchmarks.import_time --first-run
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_RUN_SCRIPT = (
+    "from streamlit.testing.v1 import AppTest\n"
+    "at = AppTest.from_file('app.py', default_timeout=300)\n"
+    "at.run()\n"
+    "assert not at.exception, at.exception\n"
+)
+
+
+def profile_imports(module):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    Returns (total_seconds, [(seconds, package)]): the module's cumulative
+    import time, and the time each top-level package took where it was first
+    imported, slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    total_us = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        cumulative = int(cumulative)
+        if name == module:
+            total_us = cumulative
+            continue
+        # A package's outermost import includes all of its submodules, so the largest figure is its cost.
+        root = name.split(".")[0]
+        packages[root] = max(packages.get(root, 0), cumulative)
+    ranked = sorted(((us / 1e6, root) for root, us in packages.items()), reverse=True)
+    return total_us / 1e6, ranked
+
+
+def time_first_run():
+    """Seconds for a fresh process to start and render the first run of app.py."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", FIRST_RUN_SCRIPT], cwd=PROJECT_ROOT, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["ui"],
+                        help="Modules to profile (default: ui, which app.py imports before the login page).")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list per module.")
+    parser.add_argument("--first-run", action="store_true",
+                        help="Also time a fresh process rendering app.py's login page (needs streamlit).")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        total, packages = profile_imports(module)
+        print(f"\nimport {module}: {total * 1000:.0f} ms")
+        for seconds, name in packages[:args.top]:
+            print(f"  {seconds * 1000:>8.1f} ms  {name}")
+
+    if args.first_run:
+        print(f"\nlogin page first run (fresh process): {time_first_run():.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Recall@k and query latency of the approximate index types against the flat baseline.
+
+Run from the project root, either on synthetic vectors or on the chunks of a real PDF:
+
+    python -m benchmarks.index_recall --synthetic 250000
+    python -m benchmarks.index_recall --pdf user_uploads/alice/notes.pdf
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from vector_index import INDEX_TYPES, build_index
+
+
+def load_pdf_embeddings(pdf_path):
+    """Embeds the chunks of a PDF exactly the way RAGRetriever does at ingest."""
+    from langchain_core.documents import Document
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from embedding_cache import EMBEDDING_MODEL_NAME, get_embedding_model
+    from page_cache import load_pages
+    from rag_retriever import CHUNK_SIZE, CHUNK_OVERLAP
+
+    documents = [Document(**page) for page in load_pages(pdf_path)]
+    docs = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).split_documents(documents)
+    model = get_embedding_model(EMBEDDING_MODEL_NAME)
+    return np.asarray(model.embed_documents([doc.page_content for doc in docs]), dtype="float32")
+
+
+def synthetic_embeddings(num_vectors, dim, seed=0):
+    """Clustered random vectors, which behave more like sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, num_vectors // 500), dim)).astype("float32")
+    labels = rng.integers(0, len(centers), size=num_vectors)
+    return centers[labels] + 0.3 * rng.normal(size=(num_vectors, dim)).astype("float32")
+
+
+def run(embeddings, num_queries, k):
+    """Builds every index type and prints recall@k and latency relative to the flat index."""
+    rng = np.random.default_rng(1)
+    query_ids = rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)
+    # Perturb the stored vectors slightly so queries are not exact duplicates.
+    queries = embeddings[query_ids] + 0.05 * rng.normal(size=(len(query_ids), embeddings.shape[1])).astype("float32")
+
+    results = {}
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index, meta = build_index(embeddings, index_type)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, neighbours = index.search(queries, k)
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        results[index_type] = (meta["index_type"], build_seconds, query_ms, neighbours)
+
+    truth = results["flat"][3]
+    print(f"{len(embeddings)} vectors, {len(queries)} queries, k={k}")
+    print(f"{'requested':<10} {'built':<8} {'build s':>9} {'ms/query':>9} {'recall@k':>9}")
+    for index_type, (built, build_seconds, query_ms, neighbours) in results.items():
+        recall = np.mean([
+            len(set(found) & set(expected)) / k
+            for found, expected in zip(neighbours, truth)
+        ])
+        print(f"{index_type:<10} {built:<8} {build_seconds:>9.2f} {query_ms:>9.3f} {recall:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pdf", help="Benchmark on the chunk embeddings of this PDF.")
+    source.add_argument("--synthetic", type=int, help="Benchmark on this many synthetic vectors.")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors (MiniLM uses 384).")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    embeddings = load_pdf_embeddings(args.pdf) if args.pdf else synthetic_embeddings(args.synthetic, args.dim)
+    run(embeddings, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+End-to-end load test: N simulated users drive app.py headlessly and concurrently.
+
+Each user registers and logs in, adds a PDF to their chat, sends chat messages,
+sends a voice message transcribed from a WAV fixture, and generates a PDF quiz.
+MetaAI and ElevenLabs are replaced by local stand-ins, so no network access or
+API keys are needed. The report gives per-action latency percentiles,
+throughput, CPU time and peak RSS.
+
+Run from the project root (Streamlit must be installed, and meta_ai_api importable,
+e.g. after `pip install -e .`):
+
+    python -m benchmarks.load_test --users 10 --messages 3
+    python -m benchmarks.load_test --users 25 --pdf notes.pdf --wav question.wav --json results.json
+
+The app runs in a temporary working directory, so existing users, chats and
+indexes are left alone. Users run on threads in this process, the same way a
+Streamlit server runs sessions.
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(PROJECT_ROOT, "app.py")
+ACTIONS = ("login", "upload_pdf", "chat", "voice", "quiz")
+
+
+# --- Stand-ins ---
+
+class _TextToSpeechHandler(BaseHTTPRequestHandler):
+    """Answers ElevenLabs text-to-speech requests with a stream of silent audio chunks."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if "/text-to-speech/" not in self.path:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(self.server.latency)
+        for _ in range(self.server.chunks):
+            self.wfile.write(b"\x00" * 4096)
+            self.wfile.flush()
+            time.sleep(self.server.chunk_interval)
+        self.close_connection = True
+
+
+class ElevenLabsStandIn(ThreadingHTTPServer):
+    """A local stand-in for the ElevenLabs streaming text-to-speech endpoint."""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.2, chunks=8, chunk_interval=0.02):
+        super().__init__(("127.0.0.1", 0), _TextToSpeechHandler)
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_interval = chunk_interval
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="elevenlabs-standin", daemon=True).start()
+        return self
+
+
+# --- Fixtures ---
+
+def write_tone_wav(path, seconds=2.0, rate=16000, frequency=220.0):
+    """Writes a mono 16-bit tone, used when no recorded WAV fixture is given."""
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        sample = int(8000 * math.sin(2 * math.pi * frequency * i / rate))
+        frames += sample.to_bytes(2, "little", signed=True)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(bytes(frames))
+
+
+def write_text_pdf(path, pages=5):
+    """Writes a small multi-page text PDF, used when no PDF fixture is given."""
+    from fpdf import FPDF
+
+    topics = ["photosynthesis", "plate tectonics", "the water cycle", "cell division", "electric circuits"]
+    pdf = FPDF()
+    pdf.set_font("Arial", size=11)
+    for page in range(pages):
+        pdf.add_page()
+        topic = topics[page % len(topics)]
+        for paragraph in range(6):
+            pdf.multi_cell(0, 6, (
+                f"Section {page + 1}.{paragraph + 1} explains {topic}. Students learn the main terms, "
+                f"why {topic} matters, and how it connects to everyday life. Worked examples show each "
+                f"step, and a short summary lists the key facts to remember about {topic}."
+            ))
+            pdf.ln(2)
+    pdf.output(path)
+
+
+# --- Simulated User ---
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+class SimulatedUser:
+    """Drives one AppTest session through the scripted actions, timing each one."""
+
+    def __init__(self, name, pdf_fixture, record, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.name = name
+        self.pdf_fixture = pdf_fixture
+        self.record = record
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def _timed(self, action, step):
+        start = time.perf_counter()
+        error = None
+        try:
+            step()
+            if self.at.exception:
+                error = self.at.exception[0].message
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.record(action, time.perf_counter() - start, error)
+        return error is None
+
+    def login(self):
+        at = self.at
+        at.run()
+        at.text_input(key="reg_user").input(self.name)
+        at.text_input(key="reg_pass").input("load-test-password")
+        _button(at, "Register").click().run()
+        at.text_input(key="login_user").input(self.name)
+        at.text_input(key="login_pass").input("load-test-password")
+        _button(at, "Login").click().run()
+        if not at.session_state["logged_in"]:
+            raise RuntimeError("login failed")
+
+    def upload_pdf(self):
+        # AppTest can't drive st.file_uploader, so store the file the way handle_pdf_upload does
+        # and let the PDF manager index and activate it on the next run.
+        at = self.at
+        user_dir = os.path.join("user_uploads", self.name)
+        os.makedirs(user_dir, exist_ok=True)
+        path = os.path.join(user_dir, f"{self.name}_notes.pdf")
+        shutil.copyfile(self.pdf_fixture, path)
+        at.session_state["chat_pdf_paths"][at.session_state["current_chat"]].append(path)
+        at.run()
+
+    def chat(self, message):
+        self.at.chat_input[0].set_value(message).run()
+
+    def voice(self):
+        # stop_recording() returns voice_record.wav; main() has put the WAV fixture there.
+        at = self.at
+        at.session_state["recording"] = True
+        at.run()
+        _button(at, "⏹️ Stop Recording").click().run()
+
+    def quiz(self):
+        at = self.at
+        at.session_state["page"] = "quiz"
+        at.run()
+        at.radio(key="quiz_source").set_value("PDF").run()
+        _button(at, "✨ Generate Quiz").click().run()
+        if "quiz_data" not in at.session_state or not at.session_state["quiz_data"]:
+            raise RuntimeError("no quiz generated")
+
+    def run_script(self, messages):
+        if not self._timed("login", self.login):
+            return
+        self._timed("upload_pdf", self.upload_pdf)
+        for i in range(messages):
+            self._timed("chat", lambda: self.chat(f"Question {i + 1}: can you explain the main idea of section {i + 1}?"))
+        self._timed("voice", self.voice)
+        self._timed("quiz", self.quiz)
+
+
+# --- Reporting ---
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def summarize(samples, errors, wall_seconds, cpu_seconds, peak_rss_mb, meta_ai_requests):
+    actions = {}
+    for action in ACTIONS:
+        times = sorted(samples.get(action, []))
+        actions[action] = {
+            "count": len(times),
+            "errors": len(errors.get(action, [])),
+            "p50_ms": round(percentile(times, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(times, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(times, 0.99) * 1000, 1),
+            "mean_ms": round(sum(times) / len(times) * 1000, 1) if times else float("nan"),
+        }
+    total = sum(a["count"] for a in actions.values())
+    return {
+        "actions": actions,
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_actions_per_s": round(total / wall_seconds, 3) if wall_seconds else 0.0,
+        "cpu_seconds": round(cpu_seconds, 2),
+        "cpu_utilization": round(cpu_seconds / wall_seconds, 2) if wall_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "meta_ai_requests": meta_ai_requests,
+        "error_samples": {action: errs[:3] for action, errs in errors.items()},
+    }
+
+
+def print_report(report):
+    print(f"\n{'action':<11} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for action, a in report["actions"].items():
+        print(f"{action:<11} {a['count']:>6} {a['errors']:>6} {a['p50_ms']:>9} {a['p95_ms']:>9} {a['p99_ms']:>9} {a['mean_ms']:>9}")
+    print(f"\nwall time      {report['wall_seconds']} s")
+    print(f"throughput     {report['throughput_actions_per_s']} actions/s")
+    print(f"CPU time       {report['cpu_seconds']} s ({report['cpu_utilization']:.0%} of one core)")
+    print(f"peak RSS       {report['peak_rss_mb']} MB")
+    print(f"MetaAI calls   {report['meta_ai_requests']}")
+    for action, errs in report["error_samples"].items():
+        for err in errs:
+            print(f"error in {action}: {err}")
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+# --- Main ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5, help="Concurrent simulated users.")
+    parser.add_argument("--messages", type=int, default=3, help="Chat messages per user.")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which user start times are spread.")
+    parser.add_argument("--pdf", help="PDF fixture to upload (default: a generated 5-page text PDF).")
+    parser.add_argument("--wav", help="WAV fixture to transcribe (default: a generated 2 s tone).")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="MetaAI stand-in streaming rate.")
+    parser.add_argument("--latency", type=float, default=0.3, help="MetaAI stand-in first-token latency in seconds.")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="ElevenLabs stand-in latency in seconds.")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-run AppTest timeout in seconds.")
+    parser.add_argument("--json", help="Also write the report to this JSON file.")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temporary working directory.")
+    args = parser.parse_args()
+
+    # Make the app modules (and meta_ai_api, if it isn't installed) importable from the temporary directory.
+    sys.path[:0] = [PROJECT_ROOT, os.path.join(PROJECT_ROOT, "src")]
+    from meta_ai_api.standin import StandInServer
+
+    workdir = tempfile.mkdtemp(prefix="dialogix-load-")
+    pdf_fixture = os.path.abspath(args.pdf) if args.pdf else os.path.join(workdir, "fixture.pdf")
+    wav_fixture = os.path.abspath(args.wav) if args.wav else os.path.join(workdir, "fixture.wav")
+    json_path = os.path.abspath(args.json) if args.json else None
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    meta_ai = StandInServer(tokens_per_second=args.tokens_per_second, latency=args.latency).start()
+    tts = ElevenLabsStandIn(latency=args.tts_latency).start()
+    os.environ["META_AI_BASE_URL"] = meta_ai.url
+    os.environ["META_AI_GRAPH_URL"] = meta_ai.url
+    os.environ["ELEVENLABS_BASE_URL"] = tts.url
+    os.environ["DIALOGIX_TTS_PLAYBACK"] = "0"
+
+    try:
+        if not args.pdf:
+            write_text_pdf(pdf_fixture)
+        if not args.wav:
+            write_tone_wav(wav_fixture)
+        shutil.copyfile(wav_fixture, "voice_record.wav")
+        with open("config.json", "w") as f:
+            json.dump({
+                "system_prompt": "You are a helpful e-learning assistant.",
+                "whisper_model": args.whisper_model,
+                "elevenlabs_api": "standin-key",
+            }, f)
+
+        samples, errors = {}, {}
+        lock = threading.Lock()
+
+        def record(action, seconds, error):
+            with lock:
+                samples.setdefault(action, []).append(seconds)
+                if error:
+                    errors.setdefault(action, []).append(error)
+
+        def run_user(i):
+            if args.ramp_up and args.users > 1:
+                time.sleep(args.ramp_up * i / (args.users - 1))
+            SimulatedUser(f"loaduser{i}", pdf_fixture, record, args.timeout).run_script(args.messages)
+
+        print(f"Running {args.users} users x ({args.messages} chats + login, upload, voice, quiz) in {workdir}")
+        cpu_start = _cpu_seconds()
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="load-user") as pool:
+            list(pool.map(run_user, range(args.users)))
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = _cpu_seconds() - cpu_start
+
+        report = summarize(samples, errors, wall_seconds, cpu_seconds, _peak_rss_mb(), dict(meta_ai.request_counts))
+        print_report(report)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        meta_ai.stop()
+        tts.shutdown()
+        os.chdir(original_cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Checks MetaAI's retry policy and circuit breaker against the local stand-in.
+
+Three scenarios, each with a fresh stand-in and circuit breaker:
+
+  flaky     a share of messages fail with HTTP 503; retries with backoff
+            should still answer (nearly) every prompt.
+  outage    every message fails while many sessions prompt at once; the
+            breaker should open after a few failures, so sessions fail fast
+            and the stand-in sees far fewer requests than attempts allowed.
+  recovery  after the outage ends and the recovery timeout passes, one trial
+            prompt closes the breaker again.
+
+Run from the project root (with meta_ai_api importable, e.g. after `pip install -e .`):
+
+    python -m benchmarks.retry_check
+    python -m benchmarks.retry_check --error-rate 0.5 --prompts 100 --sessions 50
+
+Exits with status 1 if a scenario doesn't behave as expected.
+"""
+
+import argparse
+import math
+import sys
+import threading
+import time
+
+from meta_ai_api import MetaAI
+from meta_ai_api.exceptions import CircuitOpenError, MetaAIUnavailable
+from meta_ai_api.retry import CircuitBreaker, RetryPolicy
+from meta_ai_api.standin import StandInServer
+
+SEND_MESSAGE = "useAbraSendMessageMutation"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] if ordered else 0.0
+
+
+def make_client(server, policy, breaker):
+    """A client of the stand-in with its access token already fetched, so timings cover prompts only."""
+    client = MetaAI(base_url=server.url, graph_url=server.url, retry_policy=policy, circuit_breaker=breaker)
+    client.access_token = client.get_access_token()
+    return client
+
+
+def check(name, passed, detail):
+    print(f"  [{'PASS' if passed else 'FAIL'}] {name}: {detail}")
+    return passed
+
+
+def run_flaky(args, policy):
+    print(f"\nflaky: {args.prompts} prompts, {args.error_rate:.0%} of messages fail")
+    server = StandInServer(latency=0.0, tokens_per_second=0, reply_words=5, error_rate=args.error_rate).start()
+    try:
+        # A threshold nothing will reach: this scenario is about retries alone.
+        client = make_client(server, policy, CircuitBreaker(failure_threshold=10 ** 6))
+        latencies, failures = [], 0
+        for i in range(args.prompts):
+            start = time.perf_counter()
+            try:
+                client.prompt(f"flaky prompt {i}", new_conversation=True)
+                latencies.append(time.perf_counter() - start)
+            except MetaAIUnavailable:
+                failures += 1
+        sent = server.request_counts.get(SEND_MESSAGE, 0)
+    finally:
+        server.stop()
+
+    # A prompt fails only if all of its attempts do.
+    expected_failures = args.prompts * args.error_rate ** policy.max_attempts
+    print(f"  messages sent: {sent} for {args.prompts} prompts; "
+          f"latency p50 {percentile(latencies, 50) * 1000:.0f} ms, p95 {percentile(latencies, 95) * 1000:.0f} ms")
+    return check("retries", failures <= max(2, 3 * expected_failures),
+                 f"{failures} of {args.prompts} prompts failed (about {expected_failures:.1f} expected)")
+
+
+def run_outage_and_recovery(args, policy):
+    print(f"\noutage: {args.sessions} sessions prompt at once while every message fails")
+    server = StandInServer(latency=0.0, tokens_per_second=0, reply_words=5, error_rate=1.0).start()
+    breaker = CircuitBreaker(failure_threshold=args.failure_threshold, recovery_timeout=args.recovery_timeout)
+    results = []
+    lock = threading.Lock()
+    try:
+        clients = [make_client(server, policy, breaker) for _ in range(args.sessions)]
+
+        def session(client, i):
+            start = time.perf_counter()
+            try:
+                client.prompt(f"outage prompt {i}")
+                outcome = "answered"
+            except CircuitOpenError:
+                outcome = "failed fast"
+            except MetaAIUnavailable:
+                outcome = "gave up"
+            with lock:
+                results.append((outcome, time.perf_counter() - start))
+
+        threads = [threading.Thread(target=session, args=(client, i)) for i, client in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sent = server.request_counts.get(SEND_MESSAGE, 0)
+
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        seconds = [s for _, s in results]
+        allowed = args.sessions * policy.max_attempts
+        print(f"  outcomes: {outcomes}; time to fail p50 {percentile(seconds, 50) * 1000:.0f} ms, "
+              f"p95 {percentile(seconds, 95) * 1000:.0f} ms")
+        passed = check("breaker opened", breaker.state == CircuitBreaker.OPEN, f"state is {breaker.state}")
+        passed &= check("load shed", sent < allowed / 2,
+                        f"{sent} messages reached the stand-in; retries alone allowed up to {allowed}")
+        passed &= check("fail fast", percentile(seconds, 50) < policy.deadline,
+                        f"median session gave up after {percentile(seconds, 50):.2f}s (deadline {policy.deadline:.0f}s)")
+
+        print(f"\nrecovery: the outage ends; waiting {args.recovery_timeout:.1f}s for the breaker to allow a trial")
+        server.error_rate = 0.0
+        try:
+            clients[0].prompt("still open?")
+            passed &= check("still open before timeout", False, "a prompt went through while the breaker was open")
+        except CircuitOpenError:
+            passed &= check("still open before timeout", True, "prompts keep failing fast")
+        time.sleep(args.recovery_timeout)
+        try:
+            clients[0].prompt("trial prompt")
+            answered = True
+        except MetaAIUnavailable:
+            answered = False
+        passed &= check("trial closes breaker", answered and breaker.state == CircuitBreaker.CLOSED,
+                        f"trial {'answered' if answered else 'failed'}, breaker {breaker.state}")
+    finally:
+        server.stop()
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=50, help="Prompts in the flaky scenario.")
+    parser.add_argument("--error-rate", type=float, default=0.3, help="Failing share of messages in the flaky scenario.")
+    parser.add_argument("--sessions", type=int, default=30, help="Concurrent sessions in the outage scenario.")
+    parser.add_argument("--failure-threshold", type=int, default=5)
+    parser.add_argument("--recovery-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    # Short delays keep the check quick; the shape of the backoff is the same as the defaults'.
+    policy = RetryPolicy(max_attempts=4, base_delay=0.05, max_delay=0.5, deadline=5.0)
+    passed = run_flaky(args, policy)
+    passed &= run_outage_and_recovery(args, policy)
+    print("\nall checks passed" if passed else "\nsome checks failed")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# chat_archive.py
+
+import gzip
+import json
+import os
+import shutil
+import time
+from chat_history import ChatHistory
+from persistence import atomic_write_json
+
+# --- Constants ---
+ARCHIVE_DIR = "chat_archive"
+MANIFEST_FILE = "manifest.json"
+
+# --- Helper Functions ---
+
+def _user_dir(username):
+    return os.path.join(ARCHIVE_DIR, username)
+
+def _cold_path(username, chat_id):
+    return os.path.join(_user_dir(username), f"{chat_id}.jsonl.gz")
+
+def _save_manifest(username, entries):
+    """Writes the archive manifest atomically."""
+    atomic_write_json(os.path.join(_user_dir(username), MANIFEST_FILE), entries, indent=4)
+
+# --- Archive Operations ---
+
+def list_archived(username):
+    """Returns the user's archived chats as {chat_id, name, pdfs, archived_at} dicts."""
+    path = os.path.join(_user_dir(username), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return []
+
+def archive_chat(username, chat_id, name, pdfs):
+    """
+    Moves a chat's history into compressed cold storage and records it in the
+    user's archive manifest. Returns the manifest entry.
+    """
+    hot_path = ChatHistory(username, chat_id).path
+    cold_path = _cold_path(username, chat_id)
+    os.makedirs(_user_dir(username), exist_ok=True)
+    if os.path.exists(hot_path):
+        with open(hot_path, "rb") as src, gzip.open(cold_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(hot_path)
+
+    entry = {"chat_id": chat_id, "name": name, "pdfs": pdfs, "archived_at": time.time()}
+    entries = list_archived(username)
+    entries.append(entry)
+    _save_manifest(username, entries)
+    return entry
+
+def restore_chat(username, chat_id):
+    """
+    Moves an archived chat's history back to hot storage and removes it from
+    the manifest. Returns its manifest entry, or None if it isn't archived.
+    """
+    entries = list_archived(username)
+    entry = next((e for e in entries if e["chat_id"] == chat_id), None)
+    if entry is None:
+        return None
+
+    cold_path = _cold_path(username, chat_id)
+    hot_path = ChatHistory(username, chat_id).path
+    if os.path.exists(cold_path):
+        os.makedirs(os.path.dirname(hot_path), exist_ok=True)
+        with gzip.open(cold_path, "rb") as src, open(hot_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(cold_path)
+
+    _save_manifest(username, [e for e in entries if e["chat_id"] != chat_id])
+    return entry
@@ -1,14 +1,93 @@
-from meta_ai_api import MetaAI
-from rag_retriever import RAGRetriever
+import collections
+import threading
+import time
+from context_packer import DEFAULT_CONTEXT_TOKEN_BUDGET
+from metrics import instrument, register_collector, span, traced
+from scheduler import PRIORITY_CHAT, prompt_slot
+
+# meta_ai_api (requests-html) and rag_retriever (langchain, FAISS, HuggingFace) are
+# imported on first use, so the login page doesn't wait for them.
+
+def new_meta_ai_client():
+    """Returns a new MetaAI client, importing and instrumenting MetaAI on first use."""
+    from meta_ai_api import MetaAI
+    # Time the MetaAI calls of every client in the process, including quiz generation's.
+    instrument(
+        MetaAI,
+        {
+            "get_access_token": "meta_ai.access_token",
+            "prompt": "meta_ai.prompt",
+            "fetch_sources": "meta_ai.fetch_sources",
+        },
+        counters={"on_retry": "meta_ai.retries"},
+    )
+    return MetaAI()
+
+def _circuit_breaker_gauges():
+    """Exports how many Meta AI circuit breakers are open, and how often they opened."""
+    from meta_ai_api.retry import circuit_breakers
+    stats = [breaker.stats() for breaker in circuit_breakers().values()]
+    return {
+        "meta_ai.circuit_open": sum(s["state"] != "closed" for s in stats),
+        "meta_ai.circuit_opened": sum(s["times_opened"] for s in stats),
+    }
+
+register_collector(_circuit_breaker_gauges)
+
+# --- Warm Client Pool ---
+# Creating a MetaAI client scrapes cookies and fetching its access token waits on the
+# server, so the startup warm-up prepares a few clients ahead of the first chats.
+# Temporary access tokens don't last forever, so unused clients are dropped after a while.
+WARM_CLIENT_MAX_AGE = 15 * 60
+
+_warm_clients = collections.deque()
+_warm_clients_lock = threading.Lock()
+
+def prime_meta_ai_clients(count):
+    """Creates `count` clients with their cookies and access tokens ready, and pools them."""
+    for _ in range(count):
+        client = new_meta_ai_client()
+        if not client.is_authed:
+            client.access_token = client.get_access_token()
+        with _warm_clients_lock:
+            _warm_clients.append((time.monotonic(), client))
+
+def take_meta_ai_client():
+    """Returns a warm client from the pool if a fresh one is available, or a new client."""
+    with _warm_clients_lock:
+        while _warm_clients:
+            created, client = _warm_clients.popleft()
+            if time.monotonic() - created < WARM_CLIENT_MAX_AGE:
+                return client
+    return new_meta_ai_client()
 
 class ChatEngine:
-    def __init__(self, config):
-        self.ai = MetaAI()
+    def __init__(self, config, username=None):
+        self.username = username  # Whose turn it is in the prompt scheduler's queue
+        self._ai = None  # Created on the first message, see `ai`
         self.system_prompt = config.get("system_prompt", "")
+        self.config = config  # The session's settings, edited in place on the Settings page
         self.rag = None  # PDF context
 
+    @property
+    def context_token_budget(self):
+        """Read on every prompt, so a budget changed in Settings applies to chats already open."""
+        return self.config.get("context_token_budget", DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+    @property
+    def ai(self):
+        """
+        The MetaAI client, taken on first use. Logging in creates an engine per
+        saved chat, so creating clients eagerly made login wait on a cookie
+        scrape per chat.
+        """
+        if self._ai is None:
+            self._ai = take_meta_ai_client()
+        return self._ai
+
     def attach_pdf(self, pdf_path):
         try:
+            from rag_retriever import RAGRetriever
             self.rag = RAGRetriever(pdf_path)
             return True, f"✅ Loaded context from {pdf_path}"
         except Exception as e:
@@ -16,7 +95,8 @@ class ChatEngine:
 
     def build_prompt(self, user_input):
         if self.rag:
-            context = self.rag.retrieve_context(user_input, k=3)
+            with span("chat.retrieval"):
+                context = self.rag.retrieve_packed_context(user_input, self.context_token_budget)
             prompt = (
                 f"{self.system_prompt}\n\n"
                 f"Use the following context to answer the question:\n"
@@ -27,9 +107,11 @@ class ChatEngine:
         else:
             return f"{self.system_prompt}\nUser: {user_input}"
 
+    @traced("chat.turn")
     def get_response(self, user_input):
         prompt = self.build_prompt(user_input)
         try:
-            return self.ai.prompt(message=prompt).get('message', "❌ No response from MetaAI.")
+            with prompt_slot(self.username, PRIORITY_CHAT):
+                return self.ai.prompt(message=prompt).get('message', "❌ No response from MetaAI.")
         except Exception as e:
             return f"🛑 Error from MetaAI: {str(e)}"
@@ -0,0 +1,139 @@
+# chat_history.py
+
+import json
+import os
+import uuid
+
+# --- Constants ---
+CHAT_HISTORY_DIR = "chat_histories"
+# Number of most recent messages loaded when a chat is opened, and per "load older" click.
+HISTORY_WINDOW = 50
+READ_BLOCK_SIZE = 64 * 1024
+
+def new_chat_id():
+    """Returns a new unique chat identifier."""
+    return uuid.uuid4().hex
+
+def _read_lines_before(path, end_offset, count):
+    """
+    Reads up to `count` complete JSONL lines that end at or before `end_offset`,
+    scanning the file backwards so only the needed tail is read.
+
+    Returns (messages, start_offset) where start_offset is the byte position of
+    the first line returned.
+    """
+    if end_offset <= 0 or count <= 0:
+        return [], end_offset
+
+    buffer = b""
+    pos = end_offset
+    with open(path, "rb") as f:
+        while pos > 0 and buffer.count(b"\n") <= count:
+            read_size = min(READ_BLOCK_SIZE, pos)
+            pos -= read_size
+            f.seek(pos)
+            buffer = f.read(read_size) + buffer
+
+    lines = buffer.split(b"\n")
+    # The last element is whatever follows the final newline: empty, or a partial line from an interrupted write.
+    tail = lines.pop()
+    if pos > 0:
+        # The first element may start mid-line.
+        lines.pop(0)
+    selected = lines[-count:]
+    start_offset = end_offset - len(tail) - sum(len(line) + 1 for line in selected)
+
+    messages = []
+    for line in selected:
+        try:
+            messages.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return messages, start_offset
+
+class ChatHistory:
+    """
+    The messages of one chat, stored in an append-only JSONL file.
+
+    Nothing is read until the chat is first used, and then only the most recent
+    HISTORY_WINDOW messages; older ones are read on demand with `load_older`.
+    Iterating, indexing and len() work on the loaded messages only.
+    """
+    def __init__(self, username, chat_id):
+        self.username = username
+        self.chat_id = chat_id
+        self.path = os.path.join(CHAT_HISTORY_DIR, username, f"{chat_id}.jsonl")
+        self._messages = None
+        self._start_offset = 0
+
+    def _ensure_loaded(self):
+        """Reads the most recent window of messages on first use."""
+        if self._messages is None:
+            end_offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            self._messages, self._start_offset = _read_lines_before(self.path, end_offset, HISTORY_WINDOW)
+
+    @property
+    def messages(self):
+        """The loaded window of messages, oldest first."""
+        self._ensure_loaded()
+        return self._messages
+
+    @property
+    def has_older(self):
+        """True if there are stored messages before the loaded window."""
+        self._ensure_loaded()
+        return self._start_offset > 0
+
+    def load_older(self, count=HISTORY_WINDOW):
+        """Prepends up to `count` older messages to the loaded window. Returns how many were loaded."""
+        older, self._start_offset = _read_lines_before(self.path, self._start_offset, count) if self.has_older else ([], 0)
+        self._messages[:0] = older
+        return len(older)
+
+    def append(self, message):
+        """Adds a message to the end of the chat and persists it."""
+        self.extend([message])
+
+    def extend(self, messages):
+        """Adds several messages to the end of the chat and persists them in one write."""
+        messages = list(messages)
+        if not messages:
+            return
+        self.messages.extend(messages)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a+b") as f:
+            # Terminate a partial line left by an interrupted write so it can't corrupt this one.
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(b"".join(json.dumps(message).encode("utf-8") + b"\n" for message in messages))
+
+    def read_all(self):
+        """Reads every stored message without changing the loaded window."""
+        end_offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        messages = []
+        if end_offset:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        return messages
+
+    def delete(self):
+        """Removes the chat's stored messages."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._messages = []
+        self._start_offset = 0
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
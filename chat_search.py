@@ -0,0 +1,139 @@
+# chat_search.py
+
+import hashlib
+import re
+import sqlite3
+import threading
+
+# --- Constants ---
+SEARCH_DB = "chat_search.db"
+SNIPPET_TOKENS = 12
+
+_local = threading.local()
+
+# --- Connection ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY, username TEXT, chat_id TEXT, role TEXT, content TEXT, user_key TEXT
+);
+CREATE INDEX IF NOT EXISTS chat_messages_by_chat ON chat_messages (username, chat_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_index USING fts5(
+    content, user_key, content='chat_messages', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS chat_messages_ai AFTER INSERT ON chat_messages BEGIN
+    INSERT INTO message_index (rowid, content, user_key) VALUES (new.id, new.content, new.user_key);
+END;
+CREATE TRIGGER IF NOT EXISTS chat_messages_ad AFTER DELETE ON chat_messages BEGIN
+    INSERT INTO message_index (message_index, rowid, content, user_key)
+    VALUES ('delete', old.id, old.content, old.user_key);
+END;
+CREATE TABLE IF NOT EXISTS indexed_chats (username TEXT, chat_id TEXT, PRIMARY KEY (username, chat_id));
+"""
+
+def _user_key(username):
+    """
+    A single full-text token identifying a user. Searches match it along with
+    the query, so the index only visits the user's own messages.
+    """
+    return "u" + hashlib.sha1(username.encode("utf-8")).hexdigest()[:16]
+
+def _migrate_legacy_table(conn):
+    """Moves messages from the old single FTS table, which kept usernames unindexed."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages'").fetchone():
+        return
+    rows = conn.execute("SELECT username, chat_id, role, content FROM messages").fetchall()
+    with conn:
+        conn.executemany(
+            "INSERT INTO chat_messages (username, chat_id, role, content, user_key) VALUES (?, ?, ?, ?, ?)",
+            [(username, chat_id, role, content, _user_key(username)) for username, chat_id, role, content in rows],
+        )
+        conn.execute("DROP TABLE messages")
+
+def _connect():
+    """Returns this thread's connection to the search database, creating the schema on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SEARCH_DB, timeout=10)
+        # WAL lets searches run while another session is writing.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Messages live in a regular table indexed by (username, chat_id), so deleting a
+        # chat is an index lookup; the full-text index is kept in step by the triggers.
+        # Chats in indexed_chats have had their existing history indexed; later
+        # messages are indexed as they are appended.
+        conn.executescript(SCHEMA)
+        _migrate_legacy_table(conn)
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+def _insert_messages(conn, username, chat_id, messages):
+    conn.executemany(
+        "INSERT INTO chat_messages (username, chat_id, role, content, user_key) VALUES (?, ?, ?, ?, ?)",
+        [(username, chat_id, m.get("role", ""), m.get("content", ""), _user_key(username)) for m in messages],
+    )
+
+# --- Indexing ---
+
+def index_message(username, chat_id, message):
+    """Adds one chat message to the index."""
+    conn = _connect()
+    with conn:
+        _insert_messages(conn, username, chat_id, [message])
+
+def ensure_chat_indexed(username, chat_id, read_messages):
+    """
+    Indexes a chat's existing messages once. `read_messages` is only called
+    for chats that haven't been indexed yet, e.g. after migrating old data.
+    """
+    conn = _connect()
+    if conn.execute("SELECT 1 FROM indexed_chats WHERE username = ? AND chat_id = ?", (username, chat_id)).fetchone():
+        return
+    with conn:
+        _insert_messages(conn, username, chat_id, read_messages())
+        conn.execute("INSERT OR IGNORE INTO indexed_chats (username, chat_id) VALUES (?, ?)", (username, chat_id))
+
+def mark_chat_indexed(username, chat_id):
+    """Records a new, empty chat as indexed so its messages are only ever indexed on append."""
+    ensure_chat_indexed(username, chat_id, list)
+
+def delete_chat_from_index(username, chat_id):
+    """Removes every indexed message of a chat."""
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM chat_messages WHERE username = ? AND chat_id = ?", (username, chat_id))
+        conn.execute("DELETE FROM indexed_chats WHERE username = ? AND chat_id = ?", (username, chat_id))
+
+# --- Searching ---
+
+def _to_match_query(query):
+    """
+    Turns free text into a safe FTS5 query: every word must match, the last
+    one as a prefix so results appear while the user is still typing.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def search_messages(username, query, limit=20):
+    """
+    Returns the user's best-matching messages as dicts with 'chat_id', 'role'
+    and a 'snippet' where matches are wrapped in ** for Markdown.
+    """
+    match_query = _to_match_query(query)
+    if not match_query:
+        return []
+    # Matching the user's key in the index skips other users' messages instead of
+    # ranking them and filtering afterwards; the key's column doesn't count towards rank.
+    rows = _connect().execute(
+        "SELECT m.chat_id, m.role, snippet(message_index, 0, '**', '**', '…', ?) "
+        "FROM message_index JOIN chat_messages m ON m.id = message_index.rowid "
+        "WHERE message_index MATCH ? "
+        "ORDER BY bm25(message_index, 1.0, 0.0) LIMIT ?",
+        (SNIPPET_TOKENS, f'user_key : "{_user_key(username)}" AND {match_query}', limit),
+    ).fetchall()
+    return [{"chat_id": chat_id, "role": role, "snippet": snippet} for chat_id, role, snippet in rows]
@@ -9,6 +9,8 @@ DEFAULT_CONFIG = {
         "Your name is Sophia. You are an E-learning Assistant. You communicate only in Urdu, but you must use English text to write (Roman Urdu). Do not use Hindi script or Devanagari. Do not use Urdu script. Only Roman Urdu using English characters is allowed."
     ),
     "whisper_model": "tiny",
+    # Maximum retrieved PDF context per prompt, in estimated tokens.
+    "context_token_budget": 800,
     "elevenlabs_api": ""
 }
 
@@ -0,0 +1,128 @@
+# context_packer.py
+
+import numpy as np
+from lexical_index import tokenize
+
+# --- Constants ---
+# Default prompt budget for retrieved context, in (estimated) tokens.
+DEFAULT_CONTEXT_TOKEN_BUDGET = 800
+# Trade-off between relevance (1.0) and diversity (0.0) in MMR selection.
+MMR_LAMBDA = 0.7
+# Longest overlap looked for between two chunks; the splitter overlaps by 50 characters.
+MAX_OVERLAP_CHARS = 200
+# Shorter shared spans are coincidence, not splitter overlap.
+MIN_OVERLAP_CHARS = 20
+CHARS_PER_TOKEN = 4
+
+# --- Token Estimation ---
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+# --- Overlap Removal ---
+
+def _overlap_length(earlier, later):
+    """Length of the longest suffix of `earlier` that is also a prefix of `later`."""
+    limit = min(len(earlier), len(later), MAX_OVERLAP_CHARS)
+    for length in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if earlier.endswith(later[:length]):
+            return length
+    return 0
+
+def merge_overlapping(texts):
+    """
+    Joins chunks given in document order, dropping the text each one repeats
+    from the end of the previous one, and chunks wholly contained in another.
+    """
+    pieces = []
+    for text in texts:
+        text = text.strip()
+        if not text or any(text in piece for piece in pieces):
+            continue
+        if pieces:
+            text = text[_overlap_length(pieces[-1], text):].lstrip()
+            if not text:
+                continue
+        pieces.append(text)
+    return "\n\n".join(pieces)
+
+# --- Maximal Marginal Relevance ---
+
+def _cosine_matrix(a, b):
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+def _jaccard_matrix(texts):
+    sets = [set(tokenize(text)) for text in texts]
+    n = len(sets)
+    matrix = np.eye(n, dtype="float32")
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = sets[i] | sets[j]
+            matrix[i, j] = matrix[j, i] = len(sets[i] & sets[j]) / len(union) if union else 0.0
+    return matrix
+
+def mmr_order(texts, query_vector=None, vectors=None, lambda_mult=MMR_LAMBDA):
+    """
+    Orders candidates (given best first) by maximal marginal relevance.
+
+    With embeddings, relevance is cosine similarity to the query and redundancy
+    cosine similarity between chunks. Without them, relevance falls off with
+    the retrieval rank and redundancy is token-set Jaccard similarity.
+    """
+    n = len(texts)
+    if n <= 1:
+        return list(range(n))
+    if vectors is not None and query_vector is not None:
+        vectors = np.asarray(vectors, dtype="float32")
+        relevance = _cosine_matrix(np.asarray(query_vector, dtype="float32").reshape(1, -1), vectors)[0]
+        similarity = _cosine_matrix(vectors, vectors)
+    else:
+        relevance = 1.0 / (1.0 + np.arange(n, dtype="float32"))
+        similarity = _jaccard_matrix(texts)
+
+    selected = [int(np.argmax(relevance))]
+    remaining = set(range(n)) - set(selected)
+    while remaining:
+        candidates = sorted(remaining)
+        redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        scores = lambda_mult * relevance[candidates] - (1 - lambda_mult) * redundancy
+        best = candidates[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+# --- Packing ---
+
+def pack_context(chunks, token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, query_vector=None, vectors=None,
+                 lambda_mult=MMR_LAMBDA, diversify=True):
+    """
+    Builds a context string from retrieved chunks that fits `token_budget`.
+
+    `chunks` is a list of (position, text) pairs, best first, where position is
+    the chunk's place in the document. Chunks are taken in MMR order (or as
+    given, if `diversify` is False) while they fit, then written out in
+    document order with the splitter's overlaps removed.
+    """
+    if not chunks:
+        return ""
+    texts = [text for _, text in chunks]
+    order = mmr_order(texts, query_vector, vectors, lambda_mult) if diversify else range(len(chunks))
+
+    chosen = []
+    used = 0
+    for i in order:
+        cost = estimate_tokens(texts[i])
+        if used + cost > token_budget:
+            continue
+        chosen.append(chunks[i])
+        used += cost
+    if not chosen:
+        # Even the best chunk is over budget: send a truncated piece of it rather than nothing.
+        best = texts[order[0] if diversify else 0]
+        return best[:token_budget * CHARS_PER_TOKEN]
+
+    chosen.sort(key=lambda chunk: chunk[0])
+    return merge_overlapping(text for _, text in chosen)
@@ -0,0 +1,88 @@
+# embedding_cache.py
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+from metrics import register_collector
+
+# --- Constants ---
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+QUERY_CACHE_SIZE = 1024
+
+# One model and one query cache per embedding model name, shared by every retriever in the process.
+_registry_lock = threading.Lock()
+_models = {}
+_query_caches = {}
+
+# --- Query Embedding Cache ---
+
+class QueryEmbeddingCache:
+    """
+    A thread-safe, bounded LRU cache of query embeddings.
+
+    Vectors are only valid for the embedding model they were computed with,
+    so there is one cache per model (see `get_query_cache`).
+    """
+    def __init__(self, max_size=QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, query, embed_fn):
+        """
+        Returns the cached vector for a query, computing and storing it on a miss.
+        The returned array is shared between callers and must not be modified.
+        """
+        with self._lock:
+            vector = self._entries.get(query)
+            if vector is not None:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        # Encode outside the lock so a slow miss doesn't block hits on other threads.
+        vector = np.asarray(embed_fn(query), dtype="float32")
+
+        with self._lock:
+            self._entries[query] = vector
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+# --- Shared Registry ---
+
+def get_embedding_model(model_name=EMBEDDING_MODEL_NAME):
+    """Returns the process-wide embedding model for a name, loading it on first use."""
+    with _registry_lock:
+        if model_name not in _models:
+            _models[model_name] = HuggingFaceEmbeddings(model_name=model_name)
+        return _models[model_name]
+
+def get_query_cache(model_name=EMBEDDING_MODEL_NAME):
+    """Returns the query embedding cache shared by all retrievers using this model."""
+    with _registry_lock:
+        if model_name not in _query_caches:
+            _query_caches[model_name] = QueryEmbeddingCache()
+        return _query_caches[model_name]
+
+def _cache_counters():
+    """Exports the query caches' hit/miss totals as metrics counters."""
+    with _registry_lock:
+        caches = list(_query_caches.values())
+    stats = [cache.stats() for cache in caches]
+    return {
+        "query_embedding_cache.hits": sum(s["hits"] for s in stats),
+        "query_embedding_cache.misses": sum(s["misses"] for s in stats),
+    }
+
+register_collector(_cache_counters)
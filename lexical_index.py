@@ -0,0 +1,99 @@
+# lexical_index.py
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+# --- Constants ---
+BM25_FILE = "bm25.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps dotted numbers such as "3.2" or "10.4.1" together so chapter and
+# section references survive tokenization.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+def tokenize(text):
+    """Lowercases text and splits it into word/number tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+# --- BM25 Inverted Index ---
+
+class BM25Index:
+    """
+    An Okapi BM25 inverted index over document chunks.
+
+    Documents are identified by their position, which matches their position
+    in the FAISS index so results from both can be fused directly.
+    """
+    def __init__(self, postings=None, doc_lengths=None):
+        # term -> list of [doc_position, term_frequency]
+        self.postings = postings or {}
+        self.doc_lengths = doc_lengths or []
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, texts):
+        """Builds the index from a list of chunk texts."""
+        postings = defaultdict(list)
+        doc_lengths = []
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                postings[term].append([position, freq])
+        return cls(dict(postings), doc_lengths)
+
+    def search(self, query, k=10):
+        """Returns up to k (doc_position, score) pairs, best first."""
+        num_docs = len(self.doc_lengths)
+        if not num_docs:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            doc_freq = len(term_postings)
+            idf = math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            for position, freq in term_postings:
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[position] / (self.avg_doc_length or 1)
+                scores[position] += idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, index_path):
+        """Writes the index next to the FAISS index files."""
+        with open(os.path.join(index_path, BM25_FILE), 'w') as f:
+            json.dump({"postings": self.postings, "doc_lengths": self.doc_lengths}, f)
+
+    @classmethod
+    def load(cls, index_path):
+        """Loads a saved index, or returns None if there isn't a valid one."""
+        path = os.path.join(index_path, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return cls(data["postings"], data["doc_lengths"])
+        except (json.JSONDecodeError, KeyError):
+            return None
+
+# --- Rank Fusion ---
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merges several ranked lists of doc positions with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears in,
+    so documents ranked well by both retrievers float to the top.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            scores[position] += 1.0 / (k + rank)
+    return [position for position, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
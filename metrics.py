@@ -0,0 +1,278 @@
+# metrics.py
+
+import bisect
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- Constants ---
+METRIC_PREFIX = "dialogix"
+# Latency histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Set to a port to serve Prometheus text at /metrics.
+METRICS_PORT_ENV = "DIALOGIX_METRICS_PORT"
+# Set to a file path to append every finished span to it as a JSON line.
+SPAN_LOG_ENV = "DIALOGIX_SPAN_LOG"
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_collectors = []
+_current = threading.local()
+_span_log_lock = threading.Lock()
+_server = None
+
+# --- Histograms and Counters ---
+
+class _Histogram:
+    """Cumulative-bucket latency histogram for one stage."""
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+def observe(stage, seconds):
+    """Records one latency sample for a stage."""
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = _Histogram()
+        histogram.observe(seconds)
+
+def increment(event, amount=1):
+    """Adds to an event counter, e.g. retries or cache hits."""
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + amount
+
+def register_collector(collect):
+    """
+    Registers a function returning {event: total} for counters kept elsewhere
+    (e.g. the embedding cache's hit count). It is called at export time.
+    """
+    with _lock:
+        _collectors.append(collect)
+
+# --- Spans ---
+
+def _write_span_log(record):
+    path = os.environ.get(SPAN_LOG_ENV)
+    if not path:
+        return
+    try:
+        with _span_log_lock, open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        logging.exception("Could not write span log")
+
+def _span_record(stage, parent, attributes):
+    return {
+        "trace": parent["trace"] if parent else uuid.uuid4().hex[:16],
+        "span": stage,
+        "parent": parent["span"] if parent else None,
+        **attributes,
+    }
+
+def _finish_span(stage, record, start, error):
+    seconds = time.perf_counter() - start
+    observe(stage, seconds)
+    if error:
+        increment(f"{stage}.errors")
+    record.update(ms=round(seconds * 1000, 2), start=time.time() - seconds, error=error)
+    _write_span_log(record)
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Times a stage of a request and records it in the stage's histogram.
+
+    Spans opened inside another span on the same thread share its trace id
+    and record it as their parent, so the span log shows where a chat turn's
+    time went.
+    """
+    parent = getattr(_current, "span", None)
+    record = _span_record(stage, parent, attributes)
+    _current.span = record
+    start = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.span = parent
+        _finish_span(stage, record, start, error)
+
+def _traced_generator(stage, generator):
+    """
+    Times a generator from its first item until it is exhausted or closed.
+
+    Its span is only the current one while the generator runs: between items
+    the consumer (or another generator on the same thread) is running, and
+    spans it opens must not be recorded as children of this one.
+    """
+    record = _span_record(stage, getattr(_current, "span", None), {})
+    start = time.perf_counter()
+    error = None
+    try:
+        while True:
+            outer = getattr(_current, "span", None)
+            _current.span = record
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                _current.span = outer
+            yield item
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        generator.close()
+        _finish_span(stage, record, start, error)
+
+def traced(stage):
+    """Decorator form of `span`. Generator results are timed until they are exhausted."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if inspect.isgeneratorfunction(func):
+                return _traced_generator(stage, func(*args, **kwargs))
+            with span(stage):
+                result = func(*args, **kwargs)
+            if inspect.isgenerator(result):
+                return _traced_generator(f"{stage}.stream", result)
+            return result
+        wrapper.__traced__ = True
+        return wrapper
+    return decorator
+
+def counted(event):
+    """Decorator that increments an event counter on every call."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            increment(event)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument(cls, stages, counters=None):
+    """
+    Wraps methods of a class we don't own (e.g. MetaAI) in spans.
+    `stages` maps method names to stage names and `counters` method names to
+    events counted per call. Safe to call more than once.
+    """
+    for method_name, stage in stages.items():
+        method = getattr(cls, method_name)
+        if not getattr(method, "__traced__", False):
+            setattr(cls, method_name, traced(stage)(method))
+    for method_name, event in (counters or {}).items():
+        method = getattr(cls, method_name)
+        if not getattr(method, "__counted__", False):
+            wrapper = counted(event)(method)
+            wrapper.__counted__ = True
+            setattr(cls, method_name, wrapper)
+
+# --- Export ---
+
+def snapshot():
+    """Returns all histograms and counters as plain data, for a JSON log or the UI."""
+    with _lock:
+        collectors = list(_collectors)
+        counters = dict(_counters)
+        histograms = {
+            stage: {"count": h.count, "sum": h.sum, "buckets": list(h.buckets)}
+            for stage, h in _histograms.items()
+        }
+    for collect in collectors:
+        try:
+            counters.update(collect())
+        except Exception:
+            logging.exception("Metrics collector failed")
+    return {"histograms": histograms, "counters": counters}
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus():
+    """Renders the metrics in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_seconds Latency of each request stage.",
+        f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+    ]
+    for stage, h in sorted(data["histograms"].items()):
+        label = f'stage="{_escape_label(stage)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, h["buckets"]):
+            cumulative += count
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{{label},le="+Inf"}} {h["count"]}')
+        lines.append(f"{METRIC_PREFIX}_stage_seconds_sum{{{label}}} {h['sum']}")
+        lines.append(f"{METRIC_PREFIX}_stage_seconds_count{{{label}}} {h['count']}")
+    lines += [
+        f"# HELP {METRIC_PREFIX}_events_total Counted events such as retries and cache hits.",
+        f"# TYPE {METRIC_PREFIX}_events_total counter",
+    ]
+    for event, value in sorted(data["counters"].items()):
+        lines.append(f'{METRIC_PREFIX}_events_total{{event="{_escape_label(event)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def _metrics_handler():
+    """Builds the request handler class that serves /metrics."""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+def start_metrics_server(port=None):
+    """
+    Serves /metrics on a background thread. The port comes from the argument
+    or DIALOGIX_METRICS_PORT; without either nothing is started. Calling it
+    again (e.g. on every Streamlit rerun) does nothing.
+    """
+    global _server
+    port = port or os.environ.get(METRICS_PORT_ENV)
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        # http.server is only imported when metrics are actually served, to keep startup lean.
+        from http.server import ThreadingHTTPServer
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _metrics_handler())
+        except OSError:
+            logging.exception(f"Could not start the metrics server on port {port}")
+            return None
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
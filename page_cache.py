@@ -0,0 +1,62 @@
+# page_cache.py
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from metrics import increment, span
+
+# --- Constants ---
+PAGE_CACHE_DIR = "page_cache"
+
+# --- Helper Functions ---
+
+def file_content_hash(path):
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_path(doc_hash):
+    return os.path.join(PAGE_CACHE_DIR, f"{doc_hash}.json.gz")
+
+def _extract_pages(pdf_path):
+    """Parses a PDF into [{page_content, metadata}] dicts, one per page."""
+    # Imported here: quiz_bank uses file_content_hash on the login path, which mustn't load langchain.
+    from langchain.document_loaders import PyPDFLoader
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in PyPDFLoader(pdf_path).load()]
+
+# --- Page Cache ---
+
+def load_pages(pdf_path, doc_hash=None):
+    """
+    Returns the text of each page of a PDF, parsing it only the first time a
+    given file content is seen. The cache is keyed by content hash, so renamed
+    or re-uploaded copies of a file share one entry.
+    """
+    doc_hash = doc_hash or file_content_hash(pdf_path)
+    path = _cache_path(doc_hash)
+    pages = None
+    if os.path.exists(path):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                pages = json.load(f)
+        except (OSError, EOFError, json.JSONDecodeError):
+            pages = None
+    increment("page_cache.hits" if pages is not None else "page_cache.misses")
+    if pages is None:
+        with span("pdf.extract_pages"):
+            pages = _extract_pages(pdf_path)
+        os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PAGE_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, path)
+
+    # The cached source may be another copy of the file; report the one asked for.
+    for page in pages:
+        page["metadata"]["source"] = pdf_path
+    return pages
@@ -0,0 +1,132 @@
+# persistence.py
+
+import atexit
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from metrics import span
+
+# --- Constants ---
+# How long the writer waits after the first queued change, so a burst of saves becomes one write.
+WRITE_BEHIND_DELAY = 0.5
+
+# --- Atomic Writes ---
+
+def atomic_write_json(path, data, indent=None):
+    """
+    Writes JSON so that the file is always either the old or the new version:
+    the data goes to a temporary file in the same directory, is fsynced, and
+    then atomically renamed over the target.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Persist the rename itself (not supported on all platforms).
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+def read_json(path, default=None):
+    """Reads a JSON file, returning `default` if it is missing or corrupt."""
+    if not os.path.exists(path):
+        return {} if default is None else default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return {} if default is None else default
+
+# --- Write-Behind Store ---
+
+class WriteBehindStore:
+    """
+    A JSON file of records keyed by name (e.g. username), written behind the caller.
+
+    `put` queues a copy of a record and returns immediately. A background thread
+    waits WRITE_BEHIND_DELAY after the first change so bursts coalesce, then
+    applies every queued record in a single atomic write. Reads see queued
+    changes. `flush` writes synchronously and runs automatically at exit.
+    """
+    def __init__(self, path, delay=WRITE_BEHIND_DELAY, indent=4):
+        self.path = path
+        self.delay = delay
+        self.indent = indent
+        self._pending = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def put(self, key, record):
+        """Queues a record to be written. The record is copied, so callers may keep mutating theirs."""
+        with self._lock:
+            self._pending[key] = copy.deepcopy(record)
+        self._wakeup.set()
+
+    def read_all(self):
+        """Returns all records, including changes not written yet."""
+        data = read_json(self.path)
+        with self._lock:
+            data.update(copy.deepcopy(self._in_flight))
+            data.update(copy.deepcopy(self._pending))
+        return data
+
+    def flush(self):
+        """Writes all queued changes now, in the calling thread."""
+        self._write_pending()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            try:
+                self._write_pending()
+            except Exception:
+                logging.exception(f"Write-behind save of '{self.path}' failed; will retry on the next change.")
+
+    def _write_pending(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            try:
+                with span("persistence.write", records=len(batch)):
+                    data = read_json(self.path)
+                    data.update(batch)
+                    atomic_write_json(self.path, data, indent=self.indent)
+            except BaseException:
+                with self._lock:
+                    # Requeue the batch without overwriting anything newer.
+                    for key, record in batch.items():
+                        self._pending.setdefault(key, record)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight = {}
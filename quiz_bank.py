@@ -0,0 +1,156 @@
+# quiz_bank.py
+
+import json
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from quiz_generator import QuizGenerator, QUIZ_PROMPT_VERSION
+from quiz_parser import is_duplicate
+from persistence import atomic_write_json
+from page_cache import file_content_hash
+from metrics import increment
+from scheduler import PRIORITY_BACKGROUND
+
+# --- Constants ---
+QUIZ_BANK_DIR = "quiz_bank"
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+# Questions a new bank is filled to, per document and difficulty.
+BANK_TARGET_SIZE = 30
+# Top-ups for users who have seen most of a bank grow it, up to this size.
+MAX_BANK_SIZE = 300
+# When a user has fewer unseen questions than this left, the bank is topped up in the background.
+BANK_LOW_WATER_MARK = 10
+# Questions requested per generation round while filling.
+BANK_FILL_BATCH = 9
+# The prompt scheduler queue that bank fills wait in.
+BANK_FILL_USER = "quiz_bank"
+
+# Fills run on a small dedicated pool so they never compete with many interactive requests.
+_fill_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quiz-bank")
+_lock = threading.Lock()
+_filling = set()
+
+# --- Helper Functions ---
+
+def _bank_path(doc_hash, difficulty):
+    return os.path.join(QUIZ_BANK_DIR, f"{doc_hash}_{difficulty.lower()}_v{QUIZ_PROMPT_VERSION}.json")
+
+def _load_bank(path):
+    """Loads a bank file, or returns an empty bank."""
+    if not os.path.exists(path):
+        return {"questions": [], "served": {}}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return {"questions": [], "served": {}}
+
+def _save_bank(path, bank):
+    """Writes a bank file atomically so readers never see a half-written bank."""
+    atomic_write_json(path, bank)
+
+def _merge_questions(bank, questions):
+    """Adds questions that aren't near-duplicates of banked ones. Returns their indices."""
+    added = []
+    for question in questions:
+        if not any(is_duplicate(question, banked) for banked in bank["questions"]):
+            bank["questions"].append(question)
+            added.append(len(bank["questions"]) - 1)
+    return added
+
+# --- Background Filling ---
+
+def _fill(pdf_path, doc_hash, difficulty, config, rag, extra=0):
+    """
+    Generates questions into one bank until it reaches the target size, or
+    until it has grown by `extra` questions when that ends up larger.
+    """
+    path = _bank_path(doc_hash, difficulty)
+    # All bank fills share one lane in the prompt scheduler, behind users' chats and quizzes.
+    generator = QuizGenerator(config, username=BANK_FILL_USER, priority=PRIORITY_BACKGROUND)
+    try:
+        # One retriever for every batch, instead of each batch loading the index again.
+        if rag is None or rag.pdf_path != pdf_path:
+            from rag_retriever import RAGRetriever
+            rag = RAGRetriever(pdf_path)
+        with _lock:
+            target = min(MAX_BANK_SIZE, max(BANK_TARGET_SIZE, len(_load_bank(path)["questions"]) + extra))
+        while True:
+            with _lock:
+                missing = target - len(_load_bank(path)["questions"])
+            if missing <= 0:
+                return
+            questions = list(generator.stream_from_pdf(pdf_path, difficulty, min(missing, BANK_FILL_BATCH), rag=rag))
+            with _lock:
+                bank = _load_bank(path)
+                added = _merge_questions(bank, questions)
+                _save_bank(path, bank)
+            if not added:
+                # The model has run out of new questions for this document.
+                return
+    except Exception as e:
+        logging.warning(f"Quiz bank fill for '{pdf_path}' ({difficulty}) failed: {e}")
+    finally:
+        with _lock:
+            _filling.discard((doc_hash, difficulty))
+
+def start_bank_fill(pdf_path, config, difficulties=DIFFICULTIES, rag=None, doc_hash=None, extra=0):
+    """
+    Fills the banks for a document in the background. Returns immediately.
+    Pass the already-open `rag` retriever to avoid loading the index again,
+    and `extra` to grow banks by that many questions beyond their current size.
+    """
+    doc_hash = doc_hash or file_content_hash(pdf_path)
+    for difficulty in difficulties:
+        with _lock:
+            if (doc_hash, difficulty) in _filling:
+                continue
+            _filling.add((doc_hash, difficulty))
+        _fill_pool.submit(_fill, pdf_path, doc_hash, difficulty, config, rag, extra)
+
+# --- Serving ---
+
+def draw_questions(pdf_path, difficulty, num_questions, username, config, doc_hash=None):
+    """
+    Returns a random sample of banked questions the user hasn't been served yet,
+    or None if the bank can't cover the request (the caller should generate live).
+    Starts a background top-up when the user's unseen questions run low.
+    Pass the PDF's `doc_hash` when already known, to avoid hashing the file again.
+    """
+    doc_hash = doc_hash or file_content_hash(pdf_path)
+    path = _bank_path(doc_hash, difficulty)
+    with _lock:
+        bank = _load_bank(path)
+        served = set(bank["served"].get(username, []))
+        unseen = [i for i in range(len(bank["questions"])) if i not in served]
+        if len(unseen) < num_questions and len(bank["questions"]) >= num_questions:
+            # The user has seen everything: start a new cycle through the bank.
+            served = set()
+            unseen = list(range(len(bank["questions"])))
+
+        picked = random.sample(unseen, num_questions) if len(unseen) >= num_questions else None
+        if picked:
+            bank["served"][username] = sorted(served | set(picked))
+            _save_bank(path, bank)
+        remaining = len(unseen) - (len(picked) if picked else 0)
+
+    if remaining < BANK_LOW_WATER_MARK:
+        # Grow the bank by enough new questions for this user to get back above the mark
+        # with another quiz to spare; a full bank would otherwise just recycle questions.
+        needed = BANK_LOW_WATER_MARK - remaining + num_questions
+        start_bank_fill(pdf_path, config, (difficulty,), doc_hash=doc_hash, extra=needed)
+    increment("quiz_bank.hits" if picked else "quiz_bank.misses")
+    if not picked:
+        return None
+    return [bank["questions"][i] for i in picked]
+
+def add_questions(pdf_path, difficulty, questions, username, doc_hash=None):
+    """Stores live-generated questions in the bank, marked as served to the user who got them."""
+    path = _bank_path(doc_hash or file_content_hash(pdf_path), difficulty)
+    with _lock:
+        bank = _load_bank(path)
+        added = _merge_questions(bank, questions)
+        bank["served"][username] = sorted(set(bank["served"].get(username, [])) | set(added))
+        _save_bank(path, bank)
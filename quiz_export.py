@@ -0,0 +1,157 @@
+# quiz_export.py
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from metrics import increment
+
+# --- Constants ---
+# Rendered PDFs kept in memory, keyed by a hash of the quiz data.
+PDF_CACHE_SIZE = 32
+
+_pdf_cache = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+# --- PDF Generation ---
+
+def create_quiz_pdf(quiz_data):
+    """Generates a two-page PDF with questions and an answer key."""
+    # Imported here so only quiz export pays for loading fpdf.
+    from fpdf import FPDF
+    pdf = FPDF()
+
+    # --- Page 1: Questions ---
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, 'Quiz Questions', 0, 1, 'C')
+    pdf.ln(10)
+
+    # Get the initial left margin for indentation control
+    initial_x = pdf.get_x()
+    indent = 5 # Indent by 5 units
+
+    for i, q in enumerate(quiz_data):
+        # Use a consistent 'latin-1' encoding with replacement for unsupported characters
+        question_text = f"Q{i+1}: {q['question']}".encode('latin-1', 'replace').decode('latin-1')
+        options = [opt.encode('latin-1', 'replace').decode('latin-1') for opt in q['options']]
+
+        pdf.set_font("Arial", 'B', 12)
+        pdf.set_x(initial_x) # Ensure we start at the margin
+        pdf.multi_cell(0, 6, question_text)
+        pdf.ln(2)
+
+        pdf.set_font("Arial", '', 12)
+        for opt in options:
+            pdf.set_x(initial_x)   # Go to the left margin
+            pdf.cell(indent)       # Create the indent space
+            pdf.multi_cell(0, 6, f"- {opt}") # Write the option text
+        pdf.ln(6)
+
+    # --- Page 2: Answer Key ---
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, 'Answer Key', 0, 1, 'C')
+    pdf.ln(10)
+
+    pdf.set_font("Arial", '', 12)
+    for i, q in enumerate(quiz_data):
+        answer_text = f"Q{i+1}: {q['answer']}".encode('latin-1', 'replace').decode('latin-1')
+        pdf.set_x(initial_x) # Start at the margin
+        pdf.multi_cell(0, 6, answer_text)
+        pdf.ln(4)
+
+    # FIX: Convert the bytearray output to bytes for Streamlit
+    return bytes(pdf.output())
+
+# --- Memoised Rendering ---
+
+def quiz_hash(quiz_data):
+    """Returns a stable hash of a quiz's content."""
+    return hashlib.sha256(json.dumps(quiz_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+def get_cached_quiz_pdf(quiz_data):
+    """Returns the already-rendered PDF for a quiz, or None if it hasn't been rendered."""
+    key = quiz_hash(quiz_data)
+    with _pdf_cache_lock:
+        pdf_bytes = _pdf_cache.get(key)
+        if pdf_bytes is not None:
+            _pdf_cache.move_to_end(key)
+        return pdf_bytes
+
+def render_quiz_pdf(quiz_data):
+    """Returns the PDF for a quiz, rendering it only if an identical quiz isn't cached."""
+    pdf_bytes = get_cached_quiz_pdf(quiz_data)
+    increment("quiz_pdf_cache.hits" if pdf_bytes is not None else "quiz_pdf_cache.misses")
+    if pdf_bytes is not None:
+        return pdf_bytes
+
+    pdf_bytes = create_quiz_pdf(quiz_data)
+    with _pdf_cache_lock:
+        _pdf_cache[quiz_hash(quiz_data)] = pdf_bytes
+        while len(_pdf_cache) > PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+    return pdf_bytes
+
+# --- Batch Export ---
+
+def safe_filename(name, default="quiz"):
+    """
+    Turns an arbitrary name (e.g. a student's name from an input file) into a
+    plain file name: anything but letters, digits, '-', '_' and spaces
+    (including dots and path separators) becomes '_', so it can't point
+    outside the output folder.
+    """
+    cleaned = re.sub(r"[^\w\- ]", "_", str(name)).strip()
+    return cleaned or default
+
+def _export_one(job):
+    """Worker: renders one quiz to a file. Runs in a separate process."""
+    quiz_data, path = job
+    with open(path, "wb") as f:
+        f.write(create_quiz_pdf(quiz_data))
+    return path
+
+def export_quizzes(quizzes, out_dir, max_workers=None):
+    """
+    Renders many quizzes to PDF files in parallel worker processes.
+
+    `quizzes` maps an output name (e.g. a student's name) to its quiz data.
+    Returns the list of written file paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    used = set()
+    for name, quiz_data in quizzes.items():
+        filename = safe_filename(name)
+        # Different names can clean up to the same file name; number the repeats.
+        candidate, n = filename, 1
+        while candidate.lower() in used:
+            n += 1
+            candidate = f"{filename}_{n}"
+        used.add(candidate.lower())
+        jobs.append((quiz_data, os.path.join(out_dir, f"{candidate}.pdf")))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_export_one, jobs, chunksize=max(1, len(jobs) // 32)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a set of quizzes to PDF files in parallel.")
+    parser.add_argument("quizzes", help="JSON file: an object mapping names to quizzes, or a list of quizzes.")
+    parser.add_argument("out_dir", help="Directory to write the PDFs to.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    args = parser.parse_args()
+
+    with open(args.quizzes, "r") as f:
+        quizzes = json.load(f)
+    if isinstance(quizzes, list):
+        quizzes = {f"quiz_{i + 1}": quiz_data for i, quiz_data in enumerate(quizzes)}
+
+    paths = export_quizzes(quizzes, args.out_dir, args.workers)
+    print(f"Wrote {len(paths)} PDFs to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,113 @@
 import os
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from meta_ai_api import MetaAI
-from rag_retriever import RAGRetriever
+from chat_engine import take_meta_ai_client
+from context_packer import DEFAULT_CONTEXT_TOKEN_BUDGET
+from scheduler import PRIORITY_BACKGROUND, PRIORITY_QUIZ, prompt_slot
+from singleflight import SingleFlight
+from quiz_parser import IncrementalQuizParser, validate_question, is_duplicate
+
+# Bump whenever _build_prompt changes, so banked questions from the old prompt are not reused.
+QUIZ_PROMPT_VERSION = 1
+
+# --- Sharding Constants ---
+# A quiz is split into shards of at most this many questions, generated concurrently.
+QUESTIONS_PER_SHARD = 3
+# Number of chunks, spread across the document's topics, given to each PDF shard.
+CHUNKS_PER_SHARD = 5
+MAX_SHARD_WORKERS = 5
+# Shards one user may have on the interactive pool at once; the rest wait their turn, so
+# a single large quiz can't fill the pool ahead of other users' shards.
+MAX_SHARDS_IN_FLIGHT_PER_USER = 3
+# Background shards (e.g. quiz bank fills) have their own, smaller pool.
+MAX_BACKGROUND_SHARD_WORKERS = 3
+# Shards that fail (error, bad JSON, too few valid questions) are retried up to this many times.
+MAX_SHARD_RETRIES = 2
+
+# Shard requests run on a shared pool. MetaAI clients keep per-conversation state,
+# so each worker thread gets its own client, reused across quizzes.
+_shard_pool = ThreadPoolExecutor(max_workers=MAX_SHARD_WORKERS, thread_name_prefix="quiz-shard")
+# Background shards wait in the prompt scheduler behind interactive ones. On the shared
+# pool they could fill every worker while waiting, and interactive shards would then
+# queue in the pool where the scheduler can't see them.
+_background_shard_pool = ThreadPoolExecutor(max_workers=MAX_BACKGROUND_SHARD_WORKERS, thread_name_prefix="quiz-shard-bg")
+_shard_clients = threading.local()
+
+class _ShardDispatcher:
+    """
+    Submits shards to a pool, at most `per_user` per user at a time.
+
+    A user's further shards are held back and submitted one by one as their
+    running ones finish. They join the pool's queue behind other users' shards,
+    so users share the workers instead of being served first come, first served.
+    """
+    def __init__(self, pool, per_user):
+        self.pool = pool
+        self.per_user = per_user
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._waiting = {}  # user -> deque of (fn, args)
+
+    def submit(self, username, fn, *args):
+        with self._lock:
+            if self._in_flight.get(username, 0) >= self.per_user:
+                self._waiting.setdefault(username, deque()).append((fn, args))
+                return
+            self._in_flight[username] = self._in_flight.get(username, 0) + 1
+        self.pool.submit(self._run, username, fn, args)
+
+    def _run(self, username, fn, args):
+        try:
+            fn(*args)
+        finally:
+            # Hand this user's place on the pool to their next held-back shard, if any.
+            with self._lock:
+                waiting = self._waiting.get(username)
+                following = waiting.popleft() if waiting else None
+                if waiting is not None and not waiting:
+                    del self._waiting[username]
+                if following is None:
+                    self._in_flight[username] -= 1
+                    if not self._in_flight[username]:
+                        del self._in_flight[username]
+            if following is not None:
+                self.pool.submit(self._run, username, *following)
+
+_shard_dispatcher = _ShardDispatcher(_shard_pool, MAX_SHARDS_IN_FLIGHT_PER_USER)
+# Background shards all run as one user, so they only ever wait for their pool's workers.
+_background_shard_dispatcher = _ShardDispatcher(_background_shard_pool, MAX_BACKGROUND_SHARD_WORKERS)
+# Shard prompts start a new conversation each, so identical prompts get equivalent replies.
+_shard_flights = SingleFlight("quiz_shard")
+
+def _shard_client():
+    """Returns the MetaAI client owned by the current worker thread."""
+    if not hasattr(_shard_clients, "ai"):
+        _shard_clients.ai = take_meta_ai_client()
+    return _shard_clients.ai
+
+def _shard_sizes(num_questions):
+    """Splits a question count into shard sizes, e.g. 8 -> [3, 3, 2]."""
+    return [min(QUESTIONS_PER_SHARD, num_questions - start) for start in range(0, num_questions, QUESTIONS_PER_SHARD)]
 
 class QuizGenerator:
     """
     A class to generate quizzes from topics or PDF documents using an AI model.
     """
-    def __init__(self, config):
-        self.ai = MetaAI()
+    def __init__(self, config, username=None, priority=PRIORITY_QUIZ):
+        # Shards queue in the prompt scheduler under this user, behind interactive chat.
+        self.username = username
+        self.priority = priority
+        self._shard_dispatcher = _background_shard_dispatcher if priority >= PRIORITY_BACKGROUND else _shard_dispatcher
         # A system prompt can be used here if specific persona is needed for quiz master
-        self.system_prompt = config.get("system_prompt", "") 
+        self.system_prompt = config.get("system_prompt", "")
+        # Applies to each shard's context.
+        self.context_token_budget = config.get("context_token_budget", DEFAULT_CONTEXT_TOKEN_BUDGET)
 
-    def _build_prompt(self, context, difficulty, num_questions=5):
+    def _build_prompt(self, context, difficulty, num_questions=5, focus=None):
         """
         Builds a detailed prompt for the AI to generate a quiz in JSON format.
         """
@@ -20,8 +115,9 @@ class QuizGenerator:
             f"You are an expert quiz creator. Your task is to generate a multiple-choice quiz.\n"
             f"Based *only* on the context provided below, create a quiz with exactly {num_questions} questions.\n"
             f"The desired difficulty level for the quiz is: {difficulty}.\n"
-            f"For each question, provide 4 distinct options and clearly indicate the single correct answer.\n\n"
-            f"**Context:**\n---\n{context}\n---\n\n"
+            f"For each question, provide 4 distinct options and clearly indicate the single correct answer.\n"
+            + (f"{focus}\n" if focus else "") +
+            f"\n**Context:**\n---\n{context}\n---\n\n"
             f"**Instructions for Output:**\n"
             f"Generate the quiz in a valid, raw JSON format. The output must be a list of Python dictionaries.\n"
             f"Each dictionary must have these exact keys: 'question' (string), 'options' (a list of 4 strings), and 'answer' (the string of the correct option).\n"
@@ -31,37 +127,139 @@ class QuizGenerator:
         )
         return prompt
 
-    def generate_from_topic(self, topic, difficulty, num_questions=5):
+    def _prompt_upstream(self, prompt):
+        """Sends one shard prompt and yields the reply's text snapshots as they stream in."""
+        # The slot is held until the reply has finished streaming (or nobody reads it anymore).
+        with prompt_slot(self.username, self.priority):
+            for chunk in _shard_client().prompt(message=prompt, stream=True, new_conversation=True):
+                yield chunk.get('message', "")
+
+    def _stream_shard(self, prompt):
+        """Streams one shard's reply, yielding each valid question as soon as it is complete."""
+        parser = IncrementalQuizParser()
+        # Identical shard prompts in flight at the same time (e.g. a class quizzing on the
+        # same topic or PDF) share one MetaAI call; each caller parses the shared snapshots.
+        for snapshot in _shard_flights.stream(prompt, lambda: self._prompt_upstream(prompt)):
+            for item in parser.feed_snapshot(snapshot):
+                question = validate_question(item)
+                if question:
+                    yield question
+
+    def _stream_sharded(self, shard_prompts, shard_sizes, num_questions):
         """
-        Generates a quiz from a given topic using the AI's general knowledge.
+        Runs shard prompts concurrently and yields questions as they arrive from any shard.
+
+        `shard_prompts(i, size)` builds the prompt for shard i asking for `size`
+        questions. Near-duplicates of questions already yielded are dropped, and
+        only shards that came back short are retried.
+        """
+        results = queue.Queue()
+
+        def run_shard(i, size, attempt):
+            delivered = 0
+            try:
+                shard = self._stream_shard(shard_prompts(i, size))
+                try:
+                    for question in shard:
+                        results.put(("question", ((i, attempt), question)))
+                        delivered += 1
+                        if delivered >= size:
+                            break
+                finally:
+                    # Releases the shard's scheduler slot when stopping early. If others follow
+                    # this shard's flight, this blocks (and keeps the worker) until they are served.
+                    shard.close()
+            except Exception as e:
+                logging.warning(f"Quiz shard {i + 1} failed: {e}")
+            results.put(("done", (i, size, attempt)))
+
+        for i, size in enumerate(shard_sizes):
+            self._shard_dispatcher.submit(self.username, run_shard, i, size, 0)
+        running = len(shard_sizes)
+
+        questions = []
+        # Questions kept from each shard run, keyed by (shard, attempt). A shard is short by
+        # what was kept, not what it sent, so one whose questions were all duplicates is retried.
+        accepted = {}
+        while running:
+            kind, payload = results.get()
+            if kind == "question":
+                run, question = payload
+                if len(questions) < num_questions and not any(is_duplicate(question, q) for q in questions):
+                    questions.append(question)
+                    accepted[run] = accepted.get(run, 0) + 1
+                    yield question
+                continue
+
+            running -= 1
+            i, size, attempt = payload
+            missing = size - accepted.pop((i, attempt), 0)
+            if missing > 0 and attempt < MAX_SHARD_RETRIES and len(questions) < num_questions:
+                logging.warning(f"Retrying quiz shard {i + 1} for {missing} question(s) (attempt {attempt + 1}/{MAX_SHARD_RETRIES}).")
+                self._shard_dispatcher.submit(self.username, run_shard, i, missing, attempt + 1)
+                running += 1
+
+    def stream_from_topic(self, topic, difficulty, num_questions=5):
+        """
+        Yields validated questions about a topic as soon as each one is generated.
         """
         # The context for a topic is the topic itself, relying on the AI's internal knowledge.
         context = f"General knowledge about the topic: {topic}"
-        prompt = self._build_prompt(context, difficulty, num_questions)
+        sizes = _shard_sizes(num_questions)
+
+        def shard_prompt(i, size):
+            # Steer each shard to a different part of the topic to limit overlap between shards.
+            focus = f"This is part {i + 1} of {len(sizes)}: focus on a different aspect of the topic than the other parts." if len(sizes) > 1 else None
+            return self._build_prompt(context, difficulty, size, focus)
+
+        return self._stream_sharded(shard_prompt, sizes, num_questions)
+
+    def stream_from_pdf(self, pdf_path, difficulty, num_questions=5, rag=None):
+        """
+        Yields validated questions about a PDF as soon as each one is generated.
+        Pass the chat's open `rag` retriever to reuse it when it is for the same PDF.
+        """
+        if rag is None or rag.pdf_path != pdf_path:
+            from rag_retriever import RAGRetriever
+            rag = RAGRetriever(pdf_path)
+        sizes = _shard_sizes(num_questions)
+        # Each shard gets its own slice of the topic coverage computed at ingest,
+        # so shards ask about different parts of the document.
+        contexts = rag.coverage_context_shards(len(sizes), CHUNKS_PER_SHARD, self.context_token_budget)
+        if not any(contexts):
+            raise ValueError("Could not extract sufficient information from the PDF to create a quiz.")
+
+        filled = [context for context in contexts if context]
+
+        def shard_prompt(i, size):
+            if contexts[i]:
+                return self._build_prompt(contexts[i], difficulty, size)
+            # A short document has fewer chunks than shards. Shards left without one reuse
+            # another's context with their part number, so their prompts differ and are
+            # neither coalesced with nor answered like the shard they borrow from.
+            focus = f"This is part {i + 1} of {len(sizes)}: ask about different details of the context than the other parts."
+            return self._build_prompt(filled[i % len(filled)], difficulty, size, focus)
+
+        return self._stream_sharded(shard_prompt, sizes, num_questions)
+
+    def generate_from_topic(self, topic, difficulty, num_questions=5):
+        """
+        Generates a quiz from a given topic using the AI's general knowledge.
+        Returns a list of validated question dicts, or None on failure.
+        """
         try:
-            response = self.ai.prompt(message=prompt).get('message', "[]")
-            return response
+            return list(self.stream_from_topic(topic, difficulty, num_questions)) or None
         except Exception as e:
             st.error(f"Error generating quiz from topic: {e}")
             return None
 
-    def generate_from_pdf(self, pdf_path, difficulty, num_questions=5):
+    def generate_from_pdf(self, pdf_path, difficulty, num_questions=5, rag=None):
         """
         Generates a quiz from the content of a PDF file.
+        Returns a list of validated question dicts, or None on failure.
         """
         try:
-            rag = RAGRetriever(pdf_path)
-            # Retrieve a substantial amount of context to ensure good coverage of the PDF content.
-            # The query is generic to pull key information from the document.
-            context = rag.retrieve_context(f"Generate a quiz from the key information in this document.", k=15)
-
-            if not context:
-                st.error("Could not extract sufficient information from the PDF to create a quiz.")
-                return None
-
-            prompt = self._build_prompt(context, difficulty, num_questions)
-            response = self.ai.prompt(message=prompt).get('message', "[]")
-            return response
+            return list(self.stream_from_pdf(pdf_path, difficulty, num_questions, rag=rag)) or None
         except Exception as e:
             st.error(f"Error generating quiz from PDF: {e}")
-            return None
\ No newline at end of file
+            return None
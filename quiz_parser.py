@@ -0,0 +1,179 @@
+# quiz_parser.py
+
+import json
+import re
+
+# --- Constants ---
+# Two questions whose word sets overlap at least this much (Jaccard) are duplicates.
+DUPLICATE_SIMILARITY = 0.8
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# --- Parsing ---
+
+def parse_quiz_response(response):
+    """
+    Extracts the JSON list of questions from a model reply.
+
+    Tolerates code fences and stray text around the array. Raises ValueError
+    if no JSON array can be found.
+    """
+    if not response:
+        raise ValueError("Empty response.")
+    start = response.find("[")
+    end = response.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("No JSON array in response.")
+    try:
+        items = json.loads(response[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in response: {e}")
+    if not isinstance(items, list):
+        raise ValueError("Response JSON is not a list.")
+    return items
+
+# --- Validation ---
+
+def validate_question(item):
+    """
+    Checks and normalises one question object.
+
+    Returns a dict with 'question', 'options' and 'answer', where the answer is
+    exactly one of the options, or None if the item can't be used.
+    """
+    if not isinstance(item, dict):
+        return None
+    question = item.get("question")
+    options = item.get("options")
+    answer = item.get("answer")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if not isinstance(options, list) or not isinstance(answer, str):
+        return None
+
+    options = [str(opt).strip() for opt in options if str(opt).strip()]
+    options = list(dict.fromkeys(options))
+    if len(options) < 2:
+        return None
+
+    answer = answer.strip()
+    if answer not in options:
+        # Accept a case-insensitive match, or a bare letter such as "B".
+        lowered = [opt.lower() for opt in options]
+        if answer.lower() in lowered:
+            answer = options[lowered.index(answer.lower())]
+        elif len(answer) == 1 and "A" <= answer.upper() < chr(ord("A") + len(options)):
+            answer = options[ord(answer.upper()) - ord("A")]
+        else:
+            return None
+
+    return {"question": question.strip(), "options": options, "answer": answer}
+
+# --- De-duplication ---
+
+def _word_set(text):
+    return set(WORD_PATTERN.findall(text.lower()))
+
+def is_duplicate(question, other, threshold=DUPLICATE_SIMILARITY):
+    """True if two questions' wording overlaps at least `threshold`."""
+    words, other_words = _word_set(question["question"]), _word_set(other["question"])
+    if not words or not other_words:
+        return words == other_words
+    return len(words & other_words) / len(words | other_words) >= threshold
+
+def deduplicate_questions(questions, threshold=DUPLICATE_SIMILARITY):
+    """Drops questions that are near-duplicates of an earlier one, keeping order."""
+    kept = []
+    for question in questions:
+        if not any(is_duplicate(question, other, threshold) for other in kept):
+            kept.append(question)
+    return kept
+
+# --- Incremental Parsing ---
+
+class IncrementalQuizParser:
+    """
+    Parses a JSON array of objects as it streams in.
+
+    Feed it text as it arrives; every top-level object in the array is returned
+    as soon as its closing brace is seen. The array starts at the first '['
+    followed by '{'; text before it (such as a code fence or a bracketed aside
+    like "[the quiz]") and anything after the closing ']' is ignored, and an object
+    that fails to parse is skipped without affecting the ones around it.
+    """
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self._emitted = 0
+        # Objects to swallow after a re-parse because they were already returned.
+        self._skip = 0
+
+    def feed(self, chunk):
+        """Appends a chunk of text and returns the objects it completed."""
+        self._text += chunk
+        return self._scan()
+
+    def feed_snapshot(self, text):
+        """
+        Accepts the full text received so far, as MetaAI's streamed messages are
+        cumulative. Only the new suffix is parsed; if earlier text was rewritten,
+        the text is re-parsed and objects already returned are not returned again.
+        """
+        if text.startswith(self._text):
+            return self.feed(text[len(self._text):])
+        emitted = self._emitted
+        self.__init__()
+        self._skip = emitted
+        return self.feed(text)
+
+    def _scan(self):
+        completed = []
+        text = self._text
+        while self._pos < len(text) and not self._done:
+            char = text[self._pos]
+            if not self._in_array:
+                if char == "[":
+                    following = text[self._pos + 1:].lstrip()
+                    if not following:
+                        # Wait for more text to see whether this bracket opens the array.
+                        break
+                    self._in_array = following[0] == "{"
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    if char == "]":
+                        self._done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start is not None:
+                        try:
+                            item = json.loads(text[self._object_start:self._pos + 1])
+                        except json.JSONDecodeError:
+                            item = None
+                        self._object_start = None
+                        self._emitted += 1
+                        if self._skip:
+                            self._skip -= 1
+                        elif item is not None:
+                            completed.append(item)
+            self._pos += 1
+        return completed
@@ -2,43 +2,207 @@
 
 import os
 import hashlib
-from langchain.document_loaders import PyPDFLoader
+import uuid
+import numpy as np
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 # ✅ Corrected the FAISS import for compatibility with newer langchain versions
-from langchain_community.vectorstores import FAISS 
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from embedding_cache import EMBEDDING_MODEL_NAME, get_embedding_model, get_query_cache
+from vector_index import build_index, configure_search, save_index_meta, load_index_meta
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from topic_clusters import build_topic_clusters, save_topic_clusters, load_topic_clusters
+from page_cache import load_pages
+from context_packer import DEFAULT_CONTEXT_TOKEN_BUDGET, pack_context, merge_overlapping
+
+# Changing the chunking or EMBEDDING_MODEL_NAME makes existing indexes stale; they are
+# rebuilt from the page-text cache on next use, or offline with `python reindex.py`.
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+# How many candidates each retriever contributes before rank fusion, per result requested.
+HYBRID_CANDIDATES_PER_RESULT = 4
+# Candidates considered when packing context into a token budget.
+PACKING_CANDIDATES = 12
+
+def index_path_for(pdf_path):
+    """Returns the index folder of a PDF, named by a hash of its filename."""
+    pdf_name = os.path.basename(pdf_path)
+    pdf_hash = hashlib.md5(pdf_name.encode()).hexdigest()
+    return os.path.join("faiss_indexes", pdf_hash)
 
 class RAGRetriever:
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, index_type="auto", rebuild=False):
         self.pdf_path = pdf_path
-        self.embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        # "auto" picks flat/HNSW/IVF/IVF-PQ from the number of chunks (see vector_index.py)
+        self.index_type = index_type
+        # The model and its query-embedding cache are shared by every retriever in the process
+        self.embedding_model = get_embedding_model(EMBEDDING_MODEL_NAME)
+        self.query_cache = get_query_cache(EMBEDDING_MODEL_NAME)
 
-        # Generate a unique index folder based on PDF filename hash
-        pdf_name = os.path.basename(pdf_path)
-        pdf_hash = hashlib.md5(pdf_name.encode()).hexdigest()
-        self.index_path = os.path.join("faiss_indexes", pdf_hash)
+        self.index_path = index_path_for(pdf_path)
 
-        if os.path.exists(self.index_path):
+        if os.path.exists(self.index_path) and not rebuild and not self.is_stale(self.index_path):
             # Allow FAISS to load pickle safely if you trust the source
             self.db = FAISS.load_local(
                 self.index_path,
                 self.embedding_model,
                 allow_dangerous_deserialization=True
             )
+            self.index_meta = load_index_meta(self.index_path)
+            configure_search(self.db.index, self.index_meta)
+            self.bm25 = BM25Index.load(self.index_path)
+            if self.bm25 is None:
+                # Index saved before hybrid retrieval existed: build the lexical side once from the stored chunks.
+                self.bm25 = BM25Index.build([self._doc_at(i).page_content for i in range(self.db.index.ntotal)])
+                self.bm25.save(self.index_path)
+            self.topics = load_topic_clusters(self.index_path)
+            if self.topics is None:
+                # Older indexes are flat, so their vectors can be read back for clustering.
+                self.topics = build_topic_clusters(self.db.index.reconstruct_n(0, self.db.index.ntotal))
+                save_topic_clusters(self.index_path, self.topics)
         else:
             self._create_vector_store()
 
+    @staticmethod
+    def is_stale(index_path):
+        """
+        True if a saved index was built with other chunking or another embedding
+        model than the current settings. Indexes saved before these were
+        recorded used the same defaults.
+        """
+        meta = load_index_meta(index_path)
+        return (
+            meta.get("chunk_size", 500) != CHUNK_SIZE
+            or meta.get("chunk_overlap", 50) != CHUNK_OVERLAP
+            or meta.get("embedding_model", EMBEDDING_MODEL_NAME) != EMBEDDING_MODEL_NAME
+        )
+
     def _create_vector_store(self):
-        loader = PyPDFLoader(self.pdf_path)
-        documents = loader.load()
+        # Page text is cached by file content, so re-chunking or re-embedding skips PDF parsing.
+        documents = [Document(**page) for page in load_pages(self.pdf_path)]
 
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
         docs = splitter.split_documents(documents)
+        if not docs:
+            raise ValueError("No text could be extracted from the PDF.")
+
+        # Embed once and build the index ourselves so large corpora can use an
+        # approximate (trained) index instead of FAISS.from_documents' flat one.
+        embeddings = np.asarray(
+            self.embedding_model.embed_documents([doc.page_content for doc in docs]),
+            dtype="float32"
+        )
+        index, self.index_meta = build_index(embeddings, self.index_type)
+        self.index_meta.update(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, embedding_model=EMBEDDING_MODEL_NAME)
+        self.bm25 = BM25Index.build([doc.page_content for doc in docs])
+        self.topics = build_topic_clusters(embeddings)
 
-        self.db = FAISS.from_documents(docs, self.embedding_model)
+        doc_ids = [str(uuid.uuid4()) for _ in docs]
+        self.db = FAISS(
+            embedding_function=self.embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(doc_ids, docs))),
+            index_to_docstore_id=dict(enumerate(doc_ids)),
+        )
         os.makedirs(self.index_path, exist_ok=True)
+        # The FAISS file carries the trained IVF/PQ quantizers; the meta file the search parameters.
         self.db.save_local(self.index_path)
+        save_index_meta(self.index_path, self.index_meta)
+        self.bm25.save(self.index_path)
+        save_topic_clusters(self.index_path, self.topics)
+
+    def _doc_at(self, position):
+        """Returns the chunk stored at a FAISS index position."""
+        return self.db.docstore.search(self.db.index_to_docstore_id[position])
+
+    def _dense_ranking(self, query, k):
+        """Returns the positions of the k nearest chunks by embedding distance."""
+        query_vector = self.query_cache.get_or_compute(query, self.embedding_model.embed_query)
+        _, positions = self.db.index.search(query_vector.reshape(1, -1), k)
+        return [int(p) for p in positions[0] if p != -1]
+
+    def _lexical_ranking(self, query, k):
+        """Returns the positions of the k best BM25 matches."""
+        return [position for position, _ in self.bm25.search(query, k)]
+
+    def retrieve(self, query, k=3, mode="hybrid"):
+        """
+        Returns the top-k chunks for a query.
+
+        mode is "dense" (embeddings only), "lexical" (BM25 only) or "hybrid",
+        which fuses both rankings with reciprocal-rank fusion.
+        """
+        return [self._doc_at(position) for position in self._retrieve_positions(query, k, mode)]
 
-    def retrieve_context(self, query, k=3):
-        results = self.db.similarity_search(query, k=k)
+    def _retrieve_positions(self, query, k, mode):
+        if mode == "dense":
+            return self._dense_ranking(query, k)
+        if mode == "lexical":
+            return self._lexical_ranking(query, k)
+        depth = max(k * HYBRID_CANDIDATES_PER_RESULT, 20)
+        return reciprocal_rank_fusion([
+            self._dense_ranking(query, depth),
+            self._lexical_ranking(query, depth),
+        ])[:k]
+
+    def _vectors_at(self, positions):
+        """Reads stored embeddings back from the index, or returns None if the index can't."""
+        try:
+            return np.vstack([self.db.index.reconstruct(position) for position in positions])
+        except RuntimeError:
+            return None
+
+    def retrieve_context(self, query, k=3, mode="hybrid"):
+        results = self.retrieve(query, k=k, mode=mode)
         return "\n\n".join([doc.page_content for doc in results])
+
+    def retrieve_packed_context(self, query, token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, mode="hybrid",
+                                candidates=PACKING_CANDIDATES):
+        """
+        Returns as much relevant, non-redundant context as fits `token_budget`:
+        candidates are diversified with MMR and overlapping chunk text removed
+        (see context_packer.py).
+        """
+        positions = self._retrieve_positions(query, candidates, mode)
+        chunks = [(position, self._doc_at(position).page_content) for position in positions]
+        # The query embedding is cached by _dense_ranking, so this is a lookup, not a model call.
+        query_vector = self.query_cache.get_or_compute(query, self.embedding_model.embed_query)
+        vectors = self._vectors_at(positions) if positions else None
+        return pack_context(chunks, token_budget, query_vector=query_vector, vectors=vectors)
+
+    def coverage_chunks(self, num_chunks):
+        """
+        Returns chunks that cover the document's topics, in document order.
+
+        The selection is a prefix of the coverage order precomputed at ingest,
+        so no embedding or search is needed.
+        """
+        positions = sorted(self.topics["coverage_order"][:num_chunks])
+        return [self._doc_at(position) for position in positions]
+
+    def coverage_context(self, num_chunks):
+        results = self.coverage_chunks(num_chunks)
+        return "\n\n".join([doc.page_content for doc in results])
+
+    def coverage_context_shards(self, num_shards, chunks_per_shard, token_budget=None):
+        """
+        Splits the coverage order into `num_shards` disjoint contexts.
+
+        Shards take alternate entries of the round-robin coverage order, so each
+        one draws from a different mix of topics. Overlapping chunk text is
+        removed, and with a `token_budget` each shard keeps the chunks that fit,
+        in coverage order.
+        """
+        order = self.topics["coverage_order"]
+        contexts = []
+        for shard in range(num_shards):
+            positions = order[shard::num_shards][:chunks_per_shard]
+            chunks = [(position, self._doc_at(position).page_content) for position in positions]
+            if token_budget is None:
+                contexts.append(merge_overlapping(text for _, text in sorted(chunks)))
+            else:
+                # The coverage order is already diverse, so no MMR re-ranking here.
+                contexts.append(pack_context(chunks, token_budget, diversify=False))
+        return contexts
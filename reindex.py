@@ -0,0 +1,76 @@
+# reindex.py
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rag_retriever import RAGRetriever, index_path_for
+
+# --- Constants ---
+# Same folder as user_data.UPLOADS_DIR (not imported, to keep Streamlit out of the workers).
+UPLOADS_DIR = "user_uploads"
+# Each worker loads its own copy of the embedding model, so keep the default modest.
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# --- Helper Functions ---
+
+def find_uploaded_pdfs(uploads_dir=UPLOADS_DIR):
+    """
+    Returns every uploaded PDF, one per index folder. Index folders are named
+    by filename, so when several users uploaded the same name the most recent
+    upload wins, as it would in the app.
+    """
+    by_index = {}
+    for root, _, files in os.walk(uploads_dir):
+        for name in files:
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(root, name)
+            index_path = index_path_for(path)
+            if index_path not in by_index or os.path.getmtime(path) > os.path.getmtime(by_index[index_path]):
+                by_index[index_path] = path
+    return sorted(by_index.values())
+
+def _reindex_one(job):
+    """Worker: rebuilds one PDF's index if needed. Runs in a separate process."""
+    pdf_path, index_type, force = job
+    index_path = index_path_for(pdf_path)
+    if not force and os.path.exists(index_path) and not RAGRetriever.is_stale(index_path):
+        return pdf_path, "up to date", 0.0
+    start = time.perf_counter()
+    RAGRetriever(pdf_path, index_type=index_type, rebuild=True)
+    return pdf_path, "rebuilt", time.perf_counter() - start
+
+# --- Command Line ---
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-index uploaded PDFs offline, e.g. after changing the chunking or embedding model. "
+                    "Page text comes from the page cache, so PDFs parsed before are not parsed again."
+    )
+    parser.add_argument("--uploads", default=UPLOADS_DIR, help=f"Uploads directory (default: {UPLOADS_DIR}).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Worker processes (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--index-type", default="auto", help="Index type to build (default: auto).")
+    parser.add_argument("--force", action="store_true", help="Rebuild every index, not only stale or missing ones.")
+    args = parser.parse_args()
+
+    pdfs = find_uploaded_pdfs(args.uploads)
+    if not pdfs:
+        print(f"No PDFs found in {args.uploads}")
+        return
+
+    failed = 0
+    jobs = [(path, args.index_type, args.force) for path in pdfs]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(_reindex_one, job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                path, status, seconds = future.result()
+                print(f"{status:>10}  {path}" + (f"  ({seconds:.1f}s)" if seconds else ""))
+            except Exception as e:
+                failed += 1
+                print(f"{'failed':>10}  {futures[future]}  ({e})")
+    print(f"Processed {len(pdfs)} PDFs, {failed} failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# run_timing.py
+
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from metrics import observe
+
+# --- Constants ---
+# Recent runs kept per label for the summary.
+RUN_HISTORY = 200
+
+_lock = threading.Lock()
+_timings = defaultdict(lambda: deque(maxlen=RUN_HISTORY))
+
+# --- Recording ---
+
+def record_run_time(label, seconds):
+    """Records how long one run of a script region took."""
+    with _lock:
+        _timings[label].append(seconds)
+    observe(f"script.{label}", seconds)
+    logging.debug(f"Script run '{label}' took {seconds * 1000:.1f} ms")
+
+@contextmanager
+def timed_run(label):
+    """
+    Times a block of the Streamlit script. The time is recorded even when the
+    block ends early through st.rerun() or st.stop(), which raise exceptions.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_run_time(label, time.perf_counter() - start)
+
+def timed(label):
+    """Decorator form of `timed_run`, for page functions and fragments."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_run(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- Reporting ---
+
+def run_time_summary():
+    """Returns per-label run counts and latency percentiles in milliseconds."""
+    with _lock:
+        snapshot = {label: sorted(times) for label, times in _timings.items()}
+    summary = {}
+    for label, times in snapshot.items():
+        if not times:
+            continue
+        summary[label] = {
+            "runs": len(times),
+            "p50_ms": round(times[len(times) // 2] * 1000, 1),
+            "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 1),
+            "max_ms": round(times[-1] * 1000, 1),
+        }
+    return summary
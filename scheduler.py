@@ -0,0 +1,121 @@
+# scheduler.py
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from metrics import observe, register_collector
+
+# --- Constants ---
+# Most MetaAI prompts in flight at once across all sessions, chat and quizzes together.
+MAX_CONCURRENT_PROMPTS_ENV = "DIALOGIX_MAX_CONCURRENT_PROMPTS"
+DEFAULT_MAX_CONCURRENT_PROMPTS = 4
+
+# Lower numbers are served first: a waiting chat reply always goes before quiz shards.
+PRIORITY_CHAT = 0
+PRIORITY_QUIZ = 1
+PRIORITY_BACKGROUND = 2  # e.g. filling the quiz bank
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_QUIZ: "quiz", PRIORITY_BACKGROUND: "background"}
+
+# --- Scheduler ---
+
+class _Ticket:
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+class PromptScheduler:
+    """
+    Bounds the MetaAI prompts in flight and decides who goes next.
+
+    Waiting requests are queued per priority, and within a priority per user;
+    users take turns (round-robin), so one user's fifteen quiz shards don't
+    get ahead of another user's single request.
+    """
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT_PROMPTS):
+        self.max_concurrent = max_concurrent
+        self._cond = threading.Condition()
+        self._active = 0
+        # priority -> OrderedDict(user -> deque of tickets), users in turn order
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+
+    def _dispatch(self):
+        """Grants free slots to the next waiters. Called with the lock held."""
+        granted = False
+        while self._active < self.max_concurrent:
+            users = next((users for _, users in sorted(self._queues.items()) if users), None)
+            if users is None:
+                break
+            user, tickets = next(iter(users.items()))
+            tickets.popleft().granted = True
+            # The user goes to the back of the line, or leaves it when they have nothing else waiting.
+            if tickets:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            self._active += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, username, priority=PRIORITY_CHAT):
+        """Waits for a prompt slot and holds it for the duration of the `with` block."""
+        ticket = _Ticket()
+        start = time.perf_counter()
+        with self._cond:
+            self._queues[priority].setdefault(username, deque()).append(ticket)
+            self._dispatch()
+            try:
+                while not ticket.granted:
+                    self._cond.wait()
+            except BaseException:
+                self._abandon(username, priority, ticket)
+                raise
+        observe(f"scheduler.wait.{PRIORITY_NAMES[priority]}", time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._dispatch()
+
+    def _abandon(self, username, priority, ticket):
+        """Removes a waiter that gave up, or returns its slot if it was granted meanwhile."""
+        if ticket.granted:
+            self._active -= 1
+            self._dispatch()
+            return
+        users = self._queues[priority]
+        users[username].remove(ticket)
+        if not users[username]:
+            del users[username]
+
+    def stats(self):
+        """Returns the prompts in flight and the queue depth per priority."""
+        with self._cond:
+            stats = {"active": self._active}
+            for priority, users in self._queues.items():
+                stats[f"queued.{PRIORITY_NAMES[priority]}"] = sum(len(tickets) for tickets in users.values())
+            return stats
+
+def _max_concurrent_from_env():
+    try:
+        return max(1, int(os.environ.get(MAX_CONCURRENT_PROMPTS_ENV, DEFAULT_MAX_CONCURRENT_PROMPTS)))
+    except ValueError:
+        return DEFAULT_MAX_CONCURRENT_PROMPTS
+
+# One scheduler per process, shared by every session's chats and quizzes.
+prompt_scheduler = PromptScheduler(_max_concurrent_from_env())
+
+def prompt_slot(username, priority=PRIORITY_CHAT):
+    """Shorthand for `prompt_scheduler.slot`."""
+    return prompt_scheduler.slot(username, priority)
+
+def _queue_gauges():
+    """Exports the queue depths and prompts in flight alongside the other metrics."""
+    return {f"scheduler.{name}": value for name, value in prompt_scheduler.stats().items()}
+
+register_collector(_queue_gauges)
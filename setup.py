@@ -50,5 +50,7 @@ setuptools.setup(
     # 'extras_require' is for optional dependencies, like for development.
     extras_require={
         "dev": ["check-manifest"],
+        # Encrypted on-disk cache of Facebook sessions (see meta_ai_api.session_cache).
+        "session-cache": ["cryptography"],
     },
 )
@@ -0,0 +1,121 @@
+# singleflight.py
+
+import threading
+from metrics import increment
+
+# --- Flights ---
+
+class _Flight:
+    """One upstream call in progress and everything it has produced so far."""
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.cond = threading.Condition()
+
+    def publish(self, item):
+        with self.cond:
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a stream for a key is running,
+    other callers asking for the same key don't start their own but receive
+    the items it produces, from the first one, as they arrive.
+
+    The first caller (the leader) runs the producer on its own thread, as it
+    reads. If the leader stops reading early while others are still following,
+    closing its stream keeps the producer going on the leader's thread until
+    the end or the last follower leaves, so that close() blocks until then.
+    Errors are raised in every caller.
+    """
+    def __init__(self, name):
+        self.name = name  # Used in the metrics event names
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def stream(self, key, produce):
+        """
+        Yields the items of `produce()`, an iterator factory, sharing one run
+        of it between all callers streaming the same key at the same time.
+        The caller joins (or starts) a flight when it starts iterating.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                with flight.cond:
+                    flight.followers += 1
+        if leader:
+            increment(f"{self.name}.upstream_calls")
+            yield from self._lead(key, flight, produce)
+        else:
+            increment(f"{self.name}.coalesced")
+            yield from self._follow(flight)
+
+    def _retire(self, key, flight):
+        """Stops new callers from joining the flight and returns how many follow it."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.cond:
+            return flight.followers
+
+    def _lead(self, key, flight, produce):
+        error = None
+        source = iter(produce())
+        try:
+            for item in source:
+                flight.publish(item)
+                yield item
+        except GeneratorExit:
+            # Our caller stopped reading; finish the call for anyone following it.
+            if self._retire(key, flight):
+                try:
+                    for item in source:
+                        flight.publish(item)
+                        with flight.cond:
+                            if not flight.followers:
+                                break
+                except Exception as e:
+                    error = e
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._retire(key, flight)
+            if hasattr(source, "close"):
+                source.close()
+            flight.finish(error)
+
+    def _follow(self, flight):
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.items) and not flight.done:
+                        flight.cond.wait()
+                    items = flight.items[index:]
+                    finished = flight.done
+                    error = flight.error
+                if items:
+                    index += len(items)
+                    yield from items
+                elif finished:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with flight.cond:
+                flight.followers -= 1
@@ -4,3 +4,23 @@ class FacebookInvalidCredentialsException(Exception):
 
 class FacebookRegionBlocked(Exception):
     pass
+
+
+class MetaAITransientError(Exception):
+    """A failure that may succeed when retried: 5xx/429 responses or an incomplete reply."""
+
+
+class MetaAIRequestError(Exception):
+    """A request Meta AI rejected (4xx); retrying it won't help."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MetaAIUnavailable(Exception):
+    """Meta AI didn't answer within the retry policy's attempts or deadline."""
+
+
+class CircuitOpenError(MetaAIUnavailable):
+    """Meta AI is failing for everyone, so requests fail fast instead of waiting on it."""
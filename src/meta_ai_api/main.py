@@ -1,8 +1,12 @@
+import itertools
 import json
+from http.cookiejar import DefaultCookiePolicy
 import logging
+import os
 import time
 import urllib
 import uuid
+import warnings
 from typing import Dict, List, Generator, Iterator
 
 import requests
@@ -16,9 +20,27 @@ from meta_ai_api.utils import (
 
 from meta_ai_api.utils import get_fb_session
 
-from meta_ai_api.exceptions import FacebookRegionBlocked
+from meta_ai_api.exceptions import (
+    FacebookRegionBlocked,
+    MetaAIRequestError,
+    MetaAITransientError,
+)
+from meta_ai_api.retry import RetryPolicy, CircuitBreaker, shared_circuit_breaker
+from meta_ai_api.session_cache import SessionCache
 
 MAX_RETRIES = 3
+# (connect, read) timeouts for sending a message; the read timeout applies between streamed lines.
+REQUEST_TIMEOUT = (10, 60)
+DEFAULT_RETRY_POLICY = RetryPolicy(max_attempts=MAX_RETRIES + 1)
+
+DEFAULT_BASE_URL = "https://www.meta.ai"
+DEFAULT_GRAPH_URL = "https://graph.meta.ai"
+# Set these to point every client at a local stand-in (see meta_ai_api.standin),
+# e.g. to test or benchmark without the live service.
+BASE_URL_ENV = "META_AI_BASE_URL"
+GRAPH_URL_ENV = "META_AI_GRAPH_URL"
+# Statuses meaning an authenticated session is no longer accepted.
+SESSION_REJECTED_STATUSES = (401, 403)
 
 
 class MetaAI:
@@ -28,8 +50,34 @@ class MetaAI:
     """
 
     def __init__(
-        self, fb_email: str = None, fb_password: str = None, proxy: dict = None
+        self,
+        fb_email: str = None,
+        fb_password: str = None,
+        proxy: dict = None,
+        base_url: str = None,
+        graph_url: str = None,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        session_cache: SessionCache = None,
     ):
+        """
+        Args:
+            fb_email (str): Facebook email, for authenticated use. Defaults to None.
+            fb_password (str): Facebook password, for authenticated use. Defaults to None.
+            proxy (dict): Proxies to send requests through. Defaults to None.
+            base_url (str): Meta AI web URL. Defaults to $META_AI_BASE_URL or https://www.meta.ai.
+            graph_url (str): Meta AI Graph API URL. Defaults to $META_AI_GRAPH_URL or https://graph.meta.ai.
+            retry_policy (RetryPolicy): How failed prompts are retried. Defaults to DEFAULT_RETRY_POLICY.
+            circuit_breaker (CircuitBreaker): Breaker for the endpoint. Defaults to the one shared by
+                every client of the same Graph API URL.
+            session_cache (SessionCache): Encrypted cache of Facebook session cookies, for
+                authenticated use. Defaults to SessionCache.from_env(), i.e. none unless
+                $META_AI_SESSION_KEY is set.
+        """
+        self.base_url = (base_url or os.environ.get(BASE_URL_ENV, DEFAULT_BASE_URL)).rstrip("/")
+        self.graph_url = (graph_url or os.environ.get(GRAPH_URL_ENV, DEFAULT_GRAPH_URL)).rstrip("/")
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.circuit_breaker = circuit_breaker or shared_circuit_breaker(self.graph_url)
         self.session = requests.Session()
         self.session.headers.update(
             {
@@ -47,10 +95,27 @@ class MetaAI:
             )
 
         self.is_authed = fb_password is not None and fb_email is not None
+        self.session_cache = None
+        self.session_from_cache = False
+        if self.is_authed:
+            self.isolate_cookies()
+            self.session_cache = session_cache or SessionCache.from_env()
         self.cookies = self.get_cookies()
         self.external_conversation_id = None
         self.offline_threading_id = None
 
+    def isolate_cookies(self):
+        """
+        Stops the session from storing any cookie it receives, so one user's
+        cookies can't be sent with another request. Each request carries the
+        cookies it needs in an explicit `cookie` header instead. The session
+        itself, and its pool of keep-alive connections, is kept for every
+        message.
+        """
+        self.session.cookies.clear()
+        # No domain is allowed, so cookies are neither stored from responses nor sent from the jar.
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
     def check_proxy(self, test_url: str = "https://api.ipify.org/?format=json") -> bool:
         """
         Checks the proxy connection by making a request to a test URL.
@@ -76,12 +141,16 @@ class MetaAI:
 
         Returns:
             str: A valid access token.
+
+        Raises:
+            MetaAITransientError: If Meta AI can't be reached or answers with 429/5xx.
+            FacebookRegionBlocked: If the answer isn't JSON, which is likely a region block.
         """
 
         if self.access_token:
             return self.access_token
 
-        url = "https://www.meta.ai/api/graphql/"
+        url = f"{self.base_url}/api/graphql/"
         payload = {
             "lsd": self.cookies["lsd"],
             "fb_api_caller_class": "RelayModern",
@@ -102,7 +171,12 @@ class MetaAI:
             "x-fb-friendly-name": "useAbraAcceptTOSForTempUserMutation",
         }
 
-        response = self.session.post(url, headers=headers, data=payload)
+        try:
+            response = self.session.post(url, headers=headers, data=payload, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise MetaAITransientError(f"Could not reach Meta AI for an access token: {e}") from e
+        # An outage (5xx/429) is retried by prompt's retry policy rather than mistaken for a region block.
+        self.check_status(response)
 
         try:
             auth_json = response.json()
@@ -132,26 +206,62 @@ class MetaAI:
         """
         Sends a message to the Meta AI and returns the response.
 
+        Transient failures are retried according to `self.retry_policy`, and
+        fail fast while `self.circuit_breaker` is open. When streaming, only
+        getting the stream started is retried.
+
         Args:
             message (str): The message to send.
             stream (bool): Whether to stream the response or not. Defaults to False.
-            attempts (int): The number of attempts to retry if an error occurs. Defaults to 0.
+            attempts (int): Deprecated and ignored; retries follow `self.retry_policy`.
             new_conversation (bool): Whether to start a new conversation or not. Defaults to False.
 
         Returns:
             dict: A dictionary containing the response message and sources.
 
         Raises:
-            Exception: If unable to obtain a valid response after several attempts.
+            MetaAIUnavailable: If unable to obtain a valid response within the retry policy.
+            CircuitOpenError: If Meta AI has been failing and the circuit breaker is open.
+            MetaAIRequestError: If Meta AI rejected the request.
+        """
+        if attempts:
+            warnings.warn(
+                "MetaAI.prompt's 'attempts' argument is deprecated and ignored; "
+                "pass a RetryPolicy to MetaAI instead.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+
+        def send():
+            return self.retry_policy.call(
+                lambda: self._send_prompt(message, stream, new_conversation),
+                breaker=self.circuit_breaker,
+                on_retry=self.on_retry,
+            )
+
+        try:
+            return send()
+        except MetaAIRequestError as e:
+            # A cached Facebook session may have expired early: log in again and resend once.
+            if not self.session_from_cache or e.status_code not in SESSION_REJECTED_STATUSES:
+                raise
+            logging.info("Meta AI rejected the cached Facebook session; logging in again.")
+            self.cookies = self.get_cookies(refresh_session=True)
+            return send()
+
+    def _send_prompt(self, message: str, stream: bool, new_conversation: bool):
+        """
+        Makes one attempt at sending a message. Raises `MetaAITransientError`
+        for failures worth retrying.
         """
         if not self.is_authed:
             self.access_token = self.get_access_token()
             auth_payload = {"access_token": self.access_token}
-            url = "https://graph.meta.ai/graphql?locale=user"
+            url = f"{self.graph_url}/graphql?locale=user"
 
         else:
             auth_payload = {"fb_dtsg": self.cookies["fb_dtsg"]}
-            url = "https://www.meta.ai/api/graphql/"
+            url = f"{self.base_url}/api/graphql/"
 
         if not self.external_conversation_id or new_conversation:
             external_id = str(uuid.uuid4())
@@ -184,42 +294,71 @@ class MetaAI:
             "x-fb-friendly-name": "useAbraSendMessageMutation",
         }
         if self.is_authed:
+            # The session stores no cookies (see isolate_cookies), so only this header is sent.
             headers["cookie"] = f'abra_sess={self.cookies["abra_sess"]}'
-            # Recreate the session to avoid cookie leakage when user is authenticated
-            self.session = requests.Session()
-            self.session.proxies = self.proxy
 
-        response = self.session.post(url, headers=headers, data=payload, stream=stream)
+        response = self.session.post(
+            url, headers=headers, data=payload, stream=stream, timeout=REQUEST_TIMEOUT
+        )
+        self.check_status(response)
         if not stream:
             raw_response = response.text
             last_streamed_response = self.extract_last_response(raw_response)
             if not last_streamed_response:
-                return self.retry(message, stream=stream, attempts=attempts)
+                raise MetaAITransientError("Meta AI returned an incomplete response.")
 
             extracted_data = self.extract_data(last_streamed_response)
             return extracted_data
 
         else:
             lines = response.iter_lines()
-            is_error = json.loads(next(lines))
-            if len(is_error.get("errors", [])) > 0:
-                return self.retry(message, stream=stream, attempts=attempts)
-            return self.stream_response(lines)
+            first_line = next(lines, None)
+            try:
+                is_error = json.loads(first_line) if first_line else {}
+            except json.JSONDecodeError:
+                is_error = {"errors": [{"message": "Unreadable response"}]}
+            if not first_line or len(is_error.get("errors", [])) > 0:
+                response.close()
+                raise MetaAITransientError(f"Meta AI returned an error: {is_error.get('errors')}")
+            return self.stream_response(itertools.chain([first_line], lines))
+
+    @staticmethod
+    def check_status(response: requests.Response):
+        """
+        Raises for unsuccessful HTTP statuses: `MetaAITransientError` for
+        429 and 5xx, which may pass, and `MetaAIRequestError` for other 4xx.
+        """
+        if response.status_code == 429 or response.status_code >= 500:
+            response.close()
+            raise MetaAITransientError(f"Meta AI responded with HTTP {response.status_code}.")
+        if response.status_code >= 400:
+            response.close()
+            raise MetaAIRequestError(
+                f"Meta AI rejected the request with HTTP {response.status_code}.",
+                status_code=response.status_code,
+            )
 
     def retry(self, message: str, stream: bool = False, attempts: int = 0):
         """
-        Retries the prompt function if an error occurs.
+        Deprecated: sends the prompt again. Kept for existing callers; `prompt`
+        now retries by itself according to `self.retry_policy`, and `attempts`
+        is ignored.
         """
-        if attempts <= MAX_RETRIES:
-            logging.warning(
-                f"Was unable to obtain a valid response from Meta AI. Retrying... Attempt {attempts + 1}/{MAX_RETRIES}."
-            )
-            time.sleep(3)
-            return self.prompt(message, stream=stream, attempts=attempts + 1)
-        else:
-            raise Exception(
-                "Unable to obtain a valid response from Meta AI. Try again later."
-            )
+        warnings.warn(
+            "MetaAI.retry is deprecated; prompt retries according to its RetryPolicy.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self.prompt(message, stream=stream)
+
+    def on_retry(self, retry: int, error: BaseException, delay: float):
+        """
+        Called before each retry of a prompt.
+        """
+        logging.warning(
+            f"Was unable to obtain a valid response from Meta AI ({error}). "
+            f"Retrying in {delay:.1f}s... Attempt {retry + 1}/{self.retry_policy.max_attempts}."
+        )
 
     def extract_last_response(self, response: str) -> Dict:
         """
@@ -322,20 +461,50 @@ class MetaAI:
                 )
         return medias
 
-    def get_cookies(self) -> dict:
+    def get_fb_session(self, refresh: bool = False) -> dict:
+        """
+        Returns the Facebook session cookies for this client's account: from
+        the session cache while they are fresh, otherwise by logging in (and
+        caching the result).
+
+        Args:
+            refresh (bool): Whether to log in again even if a session is cached. Defaults to False.
+
+        Returns:
+            dict: The session cookies, including `abra_sess`.
+        """
+        if self.session_cache and not refresh:
+            fb_session = self.session_cache.load(self.fb_email)
+            if fb_session and fb_session.get("abra_sess"):
+                self.session_from_cache = True
+                return fb_session
+        fb_session = get_fb_session(self.fb_email, self.fb_password)
+        self.session_from_cache = False
+        if self.session_cache:
+            try:
+                self.session_cache.store(self.fb_email, fb_session)
+            except OSError as e:
+                logging.warning(f"Could not cache the Facebook session: {e}")
+        return fb_session
+
+    def get_cookies(self, refresh_session: bool = False) -> dict:
         """
         Extracts necessary cookies from the Meta AI main page.
 
+        Args:
+            refresh_session (bool): Whether to log in to Facebook again instead of
+                using a cached session. Defaults to False.
+
         Returns:
             dict: A dictionary containing essential cookies.
         """
         session = HTMLSession()
         headers = {}
         if self.fb_email is not None and self.fb_password is not None:
-            fb_session = get_fb_session(self.fb_email, self.fb_password)
+            fb_session = self.get_fb_session(refresh=refresh_session)
             headers = {"cookie": f"abra_sess={fb_session['abra_sess']}"}
         response = session.get(
-            "https://www.meta.ai/",
+            f"{self.base_url}/",
             headers=headers,
         )
         cookies = {
@@ -354,6 +523,10 @@ class MetaAI:
         }
 
         if len(headers) > 0:
+            if self.session_from_cache and 'DTSGInitData",[],{"token":"' not in response.text:
+                # The page came back logged out, so the cached session has expired.
+                logging.info("The cached Facebook session has expired; logging in again.")
+                return self.get_cookies(refresh_session=True)
             cookies["abra_sess"] = fb_session["abra_sess"]
         else:
             cookies["abra_csrf"] = extract_value(
@@ -372,7 +545,7 @@ class MetaAI:
             list: A list of dictionaries containing the fetched sources.
         """
 
-        url = "https://graph.meta.ai/graphql?locale=user"
+        url = f"{self.graph_url}/graphql?locale=user"
         payload = {
             "access_token": self.access_token,
             "fb_api_caller_class": "RelayModern",
@@ -0,0 +1,256 @@
+"""
+Retry policy and circuit breaker for calls to Meta AI.
+
+`RetryPolicy` retries transient failures with exponential backoff and full
+jitter, within a number of attempts and an overall deadline. `CircuitBreaker`
+is shared by every client talking to the same endpoint: after a run of
+failures it opens and calls fail immediately with `CircuitOpenError`, until a
+single trial call after the recovery timeout shows the endpoint is back.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Tuple, Type
+
+import requests
+
+from meta_ai_api.exceptions import (
+    CircuitOpenError,
+    MetaAIRequestError,
+    MetaAITransientError,
+    MetaAIUnavailable,
+)
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+DEFAULT_DEADLINE = 30.0
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 30.0
+
+# Errors worth another attempt. Anything else (e.g. a 4xx or a blocked region) is raised at once.
+TRANSIENT_ERRORS = (
+    MetaAITransientError,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one upstream endpoint across all of its clients.
+
+    Closed: calls go through. After `failure_threshold` consecutive transient
+    failures it opens: calls raise `CircuitOpenError` without touching the
+    network. After `recovery_timeout` seconds it lets one trial call through
+    (half-open); its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit. Defaults to 5.
+            recovery_timeout (float): Seconds the circuit stays open before a trial call. Defaults to 30.
+            clock (callable): Monotonic time source, replaceable in checks. Defaults to time.monotonic.
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raises `CircuitOpenError` if a call may not go through now.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with its trial call in flight.
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.recovery_timeout - (self.clock() - self.opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(
+                        f"Meta AI is currently unavailable. Try again in {remaining:.0f}s."
+                    )
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError("Meta AI is recovering. Try again in a moment.")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        """Records a call that got an answer from the endpoint, closing the circuit."""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("Meta AI circuit closed; the endpoint is answering again.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Lets another trial call through after one that ended without an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Records a transient failure, opening the circuit at the threshold or after a failed trial."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(
+                        f"Meta AI circuit opened after {self.failures} failure(s); "
+                        f"failing fast for {self.recovery_timeout:.0f}s."
+                    )
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        """Returns the state, consecutive failures and how often the circuit has opened."""
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened}
+
+
+class RetryPolicy:
+    """
+    Retries transient failures with exponential backoff and full jitter.
+
+    The n-th retry waits a random time between 0 and
+    min(max_delay, base_delay * 2**(n-1)), so clients that failed together
+    don't retry together. No retry starts if its wait would pass the deadline.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        deadline: float = DEFAULT_DEADLINE,
+        retry_on: Tuple[Type[BaseException], ...] = TRANSIENT_ERRORS,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_attempts (int): Attempts in total, including the first. Defaults to 4.
+            base_delay (float): Upper bound of the first retry's wait, in seconds. Defaults to 0.5.
+            max_delay (float): Cap on any single wait, in seconds. Defaults to 8.
+            deadline (float): Seconds from the first attempt after which no retry starts. Defaults to 30.
+            retry_on (tuple): Exception types that are retried. Defaults to TRANSIENT_ERRORS.
+            sleep (callable): Sleep function, replaceable in checks. Defaults to time.sleep.
+            clock (callable): Monotonic time source, replaceable in checks. Defaults to time.monotonic.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.sleep = sleep
+        self.clock = clock
+
+    def backoff(self, retry: int) -> float:
+        """Returns the wait before the given retry (1 for the first)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def call(
+        self,
+        func: Callable,
+        breaker: CircuitBreaker = None,
+        on_retry: Callable[[int, BaseException, float], None] = None,
+    ):
+        """
+        Calls `func()` until it succeeds, a non-transient error is raised, or
+        the attempts or deadline run out.
+
+        Args:
+            func (callable): The call to make, without arguments.
+            breaker (CircuitBreaker): Breaker consulted before, and told about, every attempt. Defaults to None.
+            on_retry (callable): Called as on_retry(retry, error, delay) before each retry's wait. Defaults to None.
+
+        Returns:
+            The result of `func()`.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            MetaAIUnavailable: If every attempt failed with a transient error.
+        """
+        start = self.clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            if breaker:
+                breaker.before_call()
+            try:
+                result = func()
+            except self.retry_on as e:
+                if breaker:
+                    breaker.record_failure()
+                if attempt >= self.max_attempts:
+                    raise MetaAIUnavailable(
+                        f"Unable to obtain a valid response from Meta AI after {attempt} attempts. Try again later."
+                    ) from e
+                delay = self.backoff(attempt)
+                if self.clock() - start + delay > self.deadline:
+                    raise MetaAIUnavailable(
+                        f"Unable to obtain a valid response from Meta AI within {self.deadline:.0f}s. Try again later."
+                    ) from e
+                if on_retry:
+                    on_retry(attempt, e, delay)
+                self.sleep(delay)
+            except MetaAIRequestError:
+                # The endpoint answered with a 4xx, so it is healthy; the request is at fault.
+                if breaker:
+                    breaker.record_success()
+                raise
+            except Exception:
+                # Anything else (e.g. an unreadable reply) says nothing good about the endpoint.
+                if breaker:
+                    breaker.record_failure()
+                raise
+            except BaseException:
+                # Interrupted (e.g. KeyboardInterrupt): give a half-open trial back without judging it.
+                if breaker:
+                    breaker.release_trial()
+                raise
+            else:
+                if breaker:
+                    breaker.record_success()
+                return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def shared_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker for an endpoint, creating it on first use."""
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker()
+        return _breakers[endpoint]
+
+
+def circuit_breakers() -> Dict[str, CircuitBreaker]:
+    """Returns every shared circuit breaker by endpoint, e.g. to export their state."""
+    with _breakers_lock:
+        return dict(_breakers)
@@ -0,0 +1,114 @@
+"""
+Encrypted on-disk cache of Facebook session cookies for authenticated clients.
+
+Logging in to Facebook for Meta AI takes several requests (the mbasic login
+form, the Meta AI state, the OIDC redirect), and doing it for every `MetaAI`
+client is slow and invites rate limiting. With a cache, the cookies from one
+login (`abra_sess` and friends) are reused by every client for the same
+account until they expire or stop working.
+
+Cookies are encrypted with Fernet from the optional `cryptography` package
+(`pip install meta_ai_api[session-cache]`), with a key from the environment:
+
+    export META_AI_SESSION_KEY=$(python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())")
+
+Without the key or the package, clients log in every time, as before.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Optional
+
+KEY_ENV = "META_AI_SESSION_KEY"
+CACHE_DIR_ENV = "META_AI_SESSION_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "meta_ai_api", "sessions")
+# Cached sessions older than this are logged in again even if they still seem to work.
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+class SessionCache:
+    """
+    Stores one encrypted file of session cookies per account, named by a hash
+    of the email address so the directory doesn't reveal who is logged in.
+    """
+
+    def __init__(self, key: bytes, directory: str = None, max_age: int = DEFAULT_MAX_AGE):
+        """
+        Args:
+            key (bytes): A Fernet key.
+            directory (str): Where to keep the files. Defaults to $META_AI_SESSION_CACHE_DIR
+                or ~/.cache/meta_ai_api/sessions.
+            max_age (int): Seconds after which a cached session counts as expired. Defaults to a day.
+        """
+        from cryptography.fernet import Fernet
+
+        self.fernet = Fernet(key)
+        self.directory = directory or os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.max_age = max_age
+
+    @classmethod
+    def from_env(cls) -> Optional["SessionCache"]:
+        """
+        Returns a cache using the key in $META_AI_SESSION_KEY, or None when the
+        key isn't set, is invalid, or `cryptography` isn't installed.
+        """
+        key = os.environ.get(KEY_ENV)
+        if not key:
+            return None
+        try:
+            return cls(key.encode("utf-8"))
+        except ImportError:
+            logging.warning(
+                f"{KEY_ENV} is set but the 'cryptography' package is not installed; "
+                "Facebook sessions won't be cached."
+            )
+        except ValueError:
+            logging.warning(f"{KEY_ENV} is not a valid Fernet key; Facebook sessions won't be cached.")
+        return None
+
+    def _path(self, email: str) -> str:
+        digest = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.session")
+
+    def load(self, email: str) -> Optional[Dict]:
+        """
+        Returns the cached cookies for an account, or None if there are none,
+        they have expired, or they can't be decrypted (e.g. after a key change).
+        """
+        from cryptography.fernet import InvalidToken
+
+        path = self._path(email)
+        try:
+            with open(path, "rb") as f:
+                token = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # Fernet tokens carry their creation time, so the ttl check covers expiry.
+            return json.loads(self.fernet.decrypt(token, ttl=self.max_age))
+        except (InvalidToken, ValueError):
+            self.invalidate(email)
+            return None
+
+    def store(self, email: str, cookies: Dict):
+        """Encrypts and saves an account's cookies, readable by the current user only."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        token = self.fernet.encrypt(json.dumps(cookies).encode("utf-8"))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(token)
+            os.replace(tmp_path, self._path(email))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def invalidate(self, email: str):
+        """Forgets an account's cached session, e.g. when Meta AI no longer accepts it."""
+        try:
+            os.remove(self._path(email))
+        except FileNotFoundError:
+            pass
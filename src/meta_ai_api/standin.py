@@ -0,0 +1,296 @@
+"""
+A local stand-in for the Meta AI endpoints used by `MetaAI`, for tests and benchmarks.
+
+It serves the main page that `get_cookies` scrapes, the terms-of-service mutation
+that hands out temporary access tokens, streamed `useAbraSendMessageMutation`
+replies with a configurable first-token latency and token rate, and the
+`AbraSearchPluginDialogQuery` sources query. Run it with:
+
+    python -m meta_ai_api.standin --port 8600 --tokens-per-second 40 --latency 0.3
+
+Add `--error-rate 0.3` to fail that share of messages with HTTP 503, e.g. to
+exercise retries and the circuit breaker (`--error-rate 1` is an outage).
+
+and point clients at it:
+
+    META_AI_BASE_URL=http://127.0.0.1:8600 META_AI_GRAPH_URL=http://127.0.0.1:8600 streamlit run app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+DEFAULT_TOKENS_PER_SECOND = 40.0
+DEFAULT_LATENCY = 0.3
+DEFAULT_REPLY_WORDS = 60
+
+COOKIE_PAGE = (
+    "<html><head><title>Meta AI</title></head><body><script>"
+    '{{"_js_datr":{{"value":"{js_datr}","expires":0}},'
+    '"abra_csrf":{{"value":"{abra_csrf}","expires":0}},'
+    '"datr":{{"value":"{datr}","expires":0}}}}'
+    '["LSD",[],{{"token":"{lsd}"}}]'
+    '["DTSGInitData",[],{{"token":"{fb_dtsg}","async_get_token":""}}]'
+    "</script></body></html>"
+)
+
+FILLER_WORDS = (
+    "the lesson covers this idea in simple steps so that every learner can follow "
+    "along and practice each part before moving on to the next topic"
+).split()
+
+QUIZ_REQUEST = re.compile(r"create a quiz with exactly (\d+) questions", re.IGNORECASE)
+
+
+def build_reply(message: str, reply_words: int = DEFAULT_REPLY_WORDS) -> str:
+    """
+    Builds a deterministic reply for a prompt.
+
+    Quiz prompts get a JSON list with the requested number of valid questions,
+    so the quiz pipeline can be exercised end to end; anything else gets
+    `reply_words` words of filler text.
+
+    Args:
+        message (str): The prompt that was sent.
+        reply_words (int): Length of non-quiz replies.
+
+    Returns:
+        str: The reply text.
+    """
+    match = QUIZ_REQUEST.search(message)
+    if match:
+        questions = []
+        for i in range(int(match.group(1))):
+            options = [f"Option {letter} for question {i + 1}" for letter in "ABCD"]
+            questions.append({
+                "question": f"Stand-in question {i + 1} ({uuid.uuid4().hex[:8]})?",
+                "options": options,
+                "answer": options[i % 4],
+            })
+        return json.dumps(questions)
+    return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(reply_words))
+
+
+def split_tokens(text: str) -> List[str]:
+    """Splits text into stream tokens: words with their trailing whitespace."""
+    return re.findall(r"\S+\s*", text) or [text]
+
+
+def message_line(text: str, message_id: str, done: bool, fetch_id: str = None) -> Dict:
+    """
+    Builds one line of a `useAbraSendMessageMutation` stream, in the shape
+    read by `MetaAI.extract_last_response` and `MetaAI.extract_data`.
+    """
+    bot_response_message = {
+        "id": message_id,
+        "streaming_state": "OVERALL_DONE" if done else "STREAMING",
+        "composed_text": {"content": [{"text": text}]},
+        "fetch_id": fetch_id,
+        "imagine_card": None,
+    }
+    return {"data": {"node": {"bot_response_message": bot_response_message}}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes requests by path and `fb_api_req_friendly_name`, like the real endpoints."""
+
+    server_version = "MetaAIStandIn/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, data: Dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != "/":
+            self.send_error(404)
+            return
+        body = COOKIE_PAGE.format(
+            js_datr=uuid.uuid4().hex,
+            abra_csrf=uuid.uuid4().hex,
+            datr=uuid.uuid4().hex,
+            lsd=uuid.uuid4().hex[:12],
+            fb_dtsg=uuid.uuid4().hex,
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        friendly_name = form.get("fb_api_req_friendly_name", [""])[0]
+        self.server.record(friendly_name)
+
+        if friendly_name == "useAbraAcceptTOSForTempUserMutation":
+            self._send_json({"data": {"xab_abra_accept_terms_of_service": {
+                "new_temp_user_auth": {"access_token": f"standin-{uuid.uuid4().hex}"}
+            }}})
+        elif friendly_name == "useAbraSendMessageMutation":
+            if random.random() < self.server.error_rate:
+                self.server.record("error")
+                self._send_json({"errors": [{"message": "Service temporarily unavailable"}]}, status=503)
+                return
+            variables = json.loads(form.get("variables", ["{}"])[0])
+            self._stream_reply(variables)
+        elif friendly_name == "AbraSearchPluginDialogQuery":
+            fetch_id = json.loads(form.get("variables", ["{}"])[0]).get("abraMessageFetchID")
+            self._send_json({"data": {"message": {"searchResults": {"references": [
+                {"title": f"Stand-in source {i + 1}", "link": f"https://example.com/{fetch_id}/{i + 1}"}
+                for i in range(2)
+            ]}}}})
+        else:
+            self._send_json({"errors": [{"message": f"Unknown query '{friendly_name}'"}]}, status=400)
+
+    def _stream_reply(self, variables: Dict):
+        """Streams cumulative snapshots of the reply, one JSON object per line."""
+        message = variables.get("message", {}).get("sensitive_string_value", "")
+        conversation_id = variables.get("externalConversationId") or str(uuid.uuid4())
+        message_id = f"{conversation_id}_{variables.get('offlineThreadingId', '0')}_0"
+        fetch_id = uuid.uuid4().hex if self.server.sources else None
+        tokens = split_tokens(build_reply(message, self.server.reply_words))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        interval = 1.0 / self.server.tokens_per_second if self.server.tokens_per_second > 0 else 0.0
+        text = ""
+        try:
+            for i, token in enumerate(tokens):
+                text += token
+                done = i == len(tokens) - 1
+                line = message_line(text.rstrip(), message_id, done, fetch_id if done else None)
+                self.wfile.write(json.dumps(line).encode("utf-8") + b"\n")
+                self.wfile.flush()
+                if not done and interval:
+                    time.sleep(interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    The stand-in HTTP server. Use `start()` to run it on a background thread
+    (e.g. from a benchmark) and `url` to configure `MetaAI(base_url=..., graph_url=...)`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tokens_per_second: float = DEFAULT_TOKENS_PER_SECOND,
+        latency: float = DEFAULT_LATENCY,
+        jitter: float = 0.0,
+        reply_words: int = DEFAULT_REPLY_WORDS,
+        sources: bool = False,
+        error_rate: float = 0.0,
+        verbose: bool = False,
+    ):
+        """
+        Args:
+            host (str): Interface to listen on. Defaults to 127.0.0.1.
+            port (int): Port to listen on; 0 picks a free one. Defaults to 0.
+            tokens_per_second (float): Streaming rate of reply tokens; 0 sends them at once.
+            latency (float): Seconds before the first token of a reply.
+            jitter (float): Random extra first-token latency, up to this many seconds.
+            reply_words (int): Length of non-quiz replies.
+            sources (bool): Whether replies carry a fetch id, making clients query sources.
+            error_rate (float): Share of messages answered with HTTP 503; can be changed while running.
+            verbose (bool): Whether to log every request.
+        """
+        super().__init__((host, port), StandInHandler)
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.jitter = jitter
+        self.reply_words = reply_words
+        self.sources = sources
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.request_counts = {}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, friendly_name: str):
+        """Counts requests per query name (and injected errors as "error"), for benchmarks to report."""
+        with self._counts_lock:
+            self.request_counts[friendly_name] = self.request_counts.get(friendly_name, 0) + 1
+
+    def start(self) -> "StandInServer":
+        """Serves on a background daemon thread and returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, name="meta-ai-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Meta AI endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_TOKENS_PER_SECOND,
+                        help="Reply streaming rate; 0 sends the whole reply at once.")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="Seconds before the first token of each reply.")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Random extra first-token latency, up to this many seconds.")
+    parser.add_argument("--reply-words", type=int, default=DEFAULT_REPLY_WORDS)
+    parser.add_argument("--sources", action="store_true", help="Attach sources to replies.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of messages (0-1) answered with HTTP 503.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        args.host,
+        args.port,
+        tokens_per_second=args.tokens_per_second,
+        latency=args.latency,
+        jitter=args.jitter,
+        reply_words=args.reply_words,
+        sources=args.sources,
+        error_rate=args.error_rate,
+        verbose=args.verbose,
+    )
+    print(f"Meta AI stand-in listening on {server.url}")
+    print(f"  export META_AI_BASE_URL={server.url} META_AI_GRAPH_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
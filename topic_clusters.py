@@ -0,0 +1,82 @@
+# topic_clusters.py
+
+import json
+import os
+
+import faiss
+import numpy as np
+
+# --- Constants ---
+TOPICS_FILE = "topics.json"
+MAX_TOPIC_CLUSTERS = 15
+REPRESENTATIVES_PER_CLUSTER = 5
+KMEANS_ITERATIONS = 20
+
+# --- Clustering ---
+
+def build_topic_clusters(embeddings, num_clusters=MAX_TOPIC_CLUSTERS):
+    """
+    Groups chunk embeddings into topics with k-means.
+
+    Returns a dict with the cluster centroids, the chunks closest to each centroid,
+    and a precomputed `coverage_order`: the best chunk of every cluster, then the
+    second best of every cluster, and so on. Taking a prefix of that list gives a
+    selection that spreads across the whole document.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    num_vectors, dim = embeddings.shape
+    num_clusters = max(1, min(num_clusters, num_vectors))
+
+    if num_clusters == num_vectors:
+        # Too few chunks to cluster: every chunk is its own topic.
+        centroids = embeddings
+        labels = np.arange(num_vectors)
+        distances = np.zeros(num_vectors, dtype="float32")
+    else:
+        kmeans = faiss.Kmeans(dim, num_clusters, niter=KMEANS_ITERATIONS, seed=1234)
+        kmeans.train(embeddings)
+        centroids = kmeans.centroids
+        found_distances, found_labels = kmeans.index.search(embeddings, 1)
+        labels = found_labels[:, 0]
+        distances = found_distances[:, 0]
+
+    clusters = []
+    for cluster_id in range(num_clusters):
+        members = np.flatnonzero(labels == cluster_id)
+        if not len(members):
+            continue
+        ranked = members[np.argsort(distances[members])]
+        clusters.append({
+            "size": int(len(members)),
+            "centroid": centroids[cluster_id].tolist(),
+            "representatives": [int(p) for p in ranked[:REPRESENTATIVES_PER_CLUSTER]],
+        })
+
+    # Larger topics first, so small selections still favour the document's main themes.
+    clusters.sort(key=lambda cluster: cluster["size"], reverse=True)
+
+    coverage_order = []
+    for rank in range(REPRESENTATIVES_PER_CLUSTER):
+        for cluster in clusters:
+            if rank < len(cluster["representatives"]):
+                coverage_order.append(cluster["representatives"][rank])
+
+    return {"clusters": clusters, "coverage_order": coverage_order}
+
+# --- Persistence ---
+
+def save_topic_clusters(index_path, topics):
+    """Writes the topic clusters next to the FAISS index files."""
+    with open(os.path.join(index_path, TOPICS_FILE), 'w') as f:
+        json.dump(topics, f)
+
+def load_topic_clusters(index_path):
+    """Loads saved topic clusters, or returns None if there aren't any."""
+    path = os.path.join(index_path, TOPICS_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return None
@@ -1,10 +1,7 @@
 import os
 import time
-import json
 import base64
 import streamlit as st
-from fpdf import FPDF
-from chat_engine import ChatEngine
 from auth import login_user, register_user
 # MODIFIED: Import the new data functions
 from user_data import (
@@ -14,20 +11,34 @@ from user_data import (
     create_new_chat_session,
     delete_chat_session,
     archive_chat_session,
-    restore_chat_session # <-- Import restore function
+    restore_chat_session, # <-- Import restore function
+    append_chat_message,
+    get_archived_sessions
 )
+from chat_search import search_messages
 from config import save_config
-from voice import speak_text, start_recording, stop_recording, transcribe_audio
 from quiz_generator import QuizGenerator
+from quiz_bank import start_bank_fill, draw_questions, add_questions
+from page_cache import file_content_hash
+from context_packer import DEFAULT_CONTEXT_TOKEN_BUDGET
+from quiz_export import get_cached_quiz_pdf, render_quiz_pdf
+from run_timing import timed, run_time_summary
+from metrics import traced
+from warmup import warmup_status
 
 # --- UI Enhancement Functions ---
 
+@st.cache_data
+def _encode_image(image_file):
+    """Reads and base64-encodes an image once per process instead of on every rerun."""
+    with open(image_file, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
 def add_bg_from_local(image_file):
     """Adds a background image from a local file to the Streamlit app."""
     if not os.path.exists(image_file):
         return
-    with open(image_file, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
+    encoded_string = _encode_image(image_file)
     st.markdown(
         f"""
         <style>
@@ -62,42 +73,6 @@ def add_bg_from_local(image_file):
         unsafe_allow_html=True
     )
 
-# --- PDF Generation Helper ---
-def create_quiz_pdf(quiz_data):
-    """Generates a two-page PDF with questions and an answer key."""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, 'Quiz Questions', 0, 1, 'C')
-    pdf.ln(10)
-    initial_x = pdf.get_x()
-    indent = 5 
-    for i, q in enumerate(quiz_data):
-        question_text = f"Q{i+1}: {q['question']}".encode('latin-1', 'replace').decode('latin-1')
-        options = [opt.encode('latin-1', 'replace').decode('latin-1') for opt in q['options']]
-        pdf.set_font("Arial", 'B', 12)
-        pdf.set_x(initial_x)
-        pdf.multi_cell(0, 6, question_text)
-        pdf.ln(2)
-        pdf.set_font("Arial", '', 12)
-        for opt in options:
-            pdf.set_x(initial_x)
-            pdf.cell(indent)
-            pdf.multi_cell(0, 6, f"- {opt}")
-        pdf.ln(6)
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, 'Answer Key', 0, 1, 'C')
-    pdf.ln(10)
-    pdf.set_font("Arial", '', 12)
-    for i, q in enumerate(quiz_data):
-        answer_text = f"Q{i+1}: {q['answer']}".encode('latin-1', 'replace').decode('latin-1')
-        pdf.set_x(initial_x)
-        pdf.multi_cell(0, 6, answer_text)
-        pdf.ln(4)
-    return bytes(pdf.output())
-
-
 # --- Authentication UI ---
 def show_login_form():
     """Displays a modern, centered login and registration form using tabs."""
@@ -134,9 +109,54 @@ def show_login_form():
 
 # --- Sidebar UI Components ---
 
+@st.fragment
+@timed("sidebar_search")
+def sidebar_chat_search():
+    """
+    Full-text search over the user's active and archived chats, in the sidebar.
+    Runs as a fragment inside `with st.sidebar:`, so typing a query reruns only the search box.
+    """
+    query = st.text_input("🔍 Search chats", placeholder="Search your messages...", key="chat_search_query")
+    if not query:
+        return
+
+    results = search_messages(st.session_state.username, query)
+    if not results:
+        st.caption("No matching messages.")
+        return
+
+    active_ids = st.session_state.chat_ids
+    archived_ids = None
+    for n, result in enumerate(results):
+        chat_id = result["chat_id"]
+        if chat_id in active_ids:
+            name = st.session_state.chat_session_names[active_ids.index(chat_id)]
+        else:
+            # Only read the archive manifest when a result comes from an archived chat.
+            if archived_ids is None:
+                archived_ids = [a["chat_id"] for a in get_archived_sessions(st.session_state.username)]
+            if chat_id not in archived_ids:
+                continue
+            name = f"{st.session_state.archived_sessions[archived_ids.index(chat_id)]['name']} (archived)"
+        with st.container(border=True):
+            st.markdown(f"**{name}** · {result['role']}\n\n{result['snippet']}")
+            if st.button("Open", key=f"search_open_{n}", use_container_width=True):
+                if chat_id not in active_ids:
+                    restore_chat_session(st.session_state.username, archived_ids.index(chat_id))
+                else:
+                    st.session_state.current_chat = active_ids.index(chat_id)
+                st.session_state.page = "chat"
+                st.rerun()
+
+@st.fragment
+@timed("sidebar_sessions")
 def sidebar_session_selector():
-    """Manages the chat session selection, renaming, and deletion in the sidebar."""
-    st.sidebar.title("💬 My Chats")
+    """
+    Manages the chat session selection, renaming, and deletion in the sidebar.
+    Runs as a fragment inside `with st.sidebar:`, so renaming or opening the
+    action menu reruns only this list; actions that change the open chat rerun the app.
+    """
+    st.title("💬 My Chats")
 
     if "confirming_action_index" not in st.session_state:
         st.session_state.confirming_action_index = None
@@ -154,7 +174,7 @@ def sidebar_session_selector():
 
     for i, name in enumerate(st.session_state.chat_session_names):
         if st.session_state.confirming_action_index == i:
-            with st.sidebar.container(border=True):
+            with st.container(border=True):
                 st.warning(f"Action for **'{name}'**?")
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -176,9 +196,9 @@ def sidebar_session_selector():
                 with col3:
                     if st.button("Cancel", key=f"cancel_action_{i}", use_container_width=True):
                         st.session_state.confirming_action_index = None
-                        st.rerun()
+                        st.rerun(scope="fragment")
         else:
-            col1, col2, col3 = st.sidebar.columns([0.7, 0.15, 0.15])
+            col1, col2, col3 = st.columns([0.7, 0.15, 0.15])
             with col1:
                 if st.session_state.get("editing_chat_index") == i:
                     st.text_input("Rename chat", value=name, key=f"rename_input_{i}", on_change=handle_rename, args=(i,), label_visibility="collapsed")
@@ -193,31 +213,33 @@ def sidebar_session_selector():
                 if st.session_state.get("editing_chat_index") == i:
                     if st.button("✅", key=f"done_{i}", help="Confirm rename"):
                         st.session_state.editing_chat_index = None
-                        st.rerun()
+                        st.rerun(scope="fragment")
                 else:
                     if st.button("✏️", key=f"edit_{i}", help="Rename chat"):
                         st.session_state.editing_chat_index = i
-                        st.rerun()
+                        st.rerun(scope="fragment")
             with col3:
                 if st.session_state.get("editing_chat_index") != i:
                     if st.button("🗑️", key=f"delete_{i}", help="Delete or Archive chat"):
                         st.session_state.confirming_action_index = i
-                        st.rerun()
+                        st.rerun(scope="fragment")
 
-    if st.sidebar.button("➕ New Chat", use_container_width=True):
+    if st.button("➕ New Chat", use_container_width=True):
         create_new_chat_session(st.session_state.username)
         st.session_state.page = "chat"
         st.session_state.editing_chat_index = None
         st.session_state.confirming_action_index = None
         st.rerun()
     
-    # MODIFIED: Archived chats expander now includes restore buttons
-    if st.session_state.get("archived_sessions"):
-        with st.sidebar.expander("🗄️ Archived Chats"):
-            if not st.session_state.archived_sessions:
+    # Archived chats live in cold storage. An expander's body runs even while collapsed,
+    # so a toggle is used to read the archive only when the user asks for it.
+    if st.toggle("🗄️ Show Archived Chats", key="show_archived_chats"):
+        with st.container(border=True):
+            archived_sessions = get_archived_sessions(st.session_state.username)
+            if not archived_sessions:
                 st.caption("No archived chats.")
             else:
-                for idx, archived in enumerate(st.session_state.archived_sessions):
+                for idx, archived in enumerate(archived_sessions):
                     col1, col2 = st.columns([0.8, 0.2])
                     with col1:
                         st.write(f"{archived['name']}")
@@ -226,70 +248,20 @@ def sidebar_session_selector():
                             restore_chat_session(st.session_state.username, idx)
                             st.toast(f"Restored chat '{archived['name']}'!", icon="🎉")
                             st.rerun()
-# (The rest of your ui.py file remains the same)
-# ...
-# --- PDF Generation Helper ---, Authentication UI, etc.
-# Make sure to include all other functions like show_pdf_manager_in_sidebar,
-# sidebar_navigation, show_chat_page, etc.
-# I'm omitting them here for brevity but you should keep them in your file.
-# --- PDF Generation Helper ---
-def create_quiz_pdf(quiz_data):
-    """Generates a two-page PDF with questions and an answer key."""
-    pdf = FPDF()
-    
-    # --- Page 1: Questions ---
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, 'Quiz Questions', 0, 1, 'C')
-    pdf.ln(10)
-    
-    # Get the initial left margin for indentation control
-    initial_x = pdf.get_x()
-    indent = 5 # Indent by 5 units
-
-    for i, q in enumerate(quiz_data):
-        # Use a consistent 'latin-1' encoding with replacement for unsupported characters
-        question_text = f"Q{i+1}: {q['question']}".encode('latin-1', 'replace').decode('latin-1')
-        options = [opt.encode('latin-1', 'replace').decode('latin-1') for opt in q['options']]
-        
-        pdf.set_font("Arial", 'B', 12)
-        pdf.set_x(initial_x) # Ensure we start at the margin
-        pdf.multi_cell(0, 6, question_text)
-        pdf.ln(2)
-        
-        pdf.set_font("Arial", '', 12)
-        for opt in options:
-            pdf.set_x(initial_x)   # Go to the left margin
-            pdf.cell(indent)       # Create the indent space
-            pdf.multi_cell(0, 6, f"- {opt}") # Write the option text
-        pdf.ln(6)
-
-    # --- Page 2: Answer Key ---
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, 'Answer Key', 0, 1, 'C')
-    pdf.ln(10)
-    
-    pdf.set_font("Arial", '', 12)
-    for i, q in enumerate(quiz_data):
-        answer_text = f"Q{i+1}: {q['answer']}".encode('latin-1', 'replace').decode('latin-1')
-        pdf.set_x(initial_x) # Start at the margin
-        pdf.multi_cell(0, 6, answer_text)
-        pdf.ln(4)
-        
-    # FIX: Convert the bytearray output to bytes for Streamlit
-    return bytes(pdf.output())
-
 
 # --- Sidebar UI Components ---
 
-
+@st.fragment
+@timed("sidebar_pdf_manager")
 def show_pdf_manager_in_sidebar(state):
-    """Renders the PDF uploader and manager in a sidebar expander."""
+    """
+    Renders the PDF uploader and manager in a sidebar expander.
+    Runs as a fragment inside `with st.sidebar:`, so activating a PDF doesn't redraw the chat.
+    """
     idx = state.current_chat
     engine = state.chat_engines[idx]
 
-    with st.sidebar.expander("📄 PDF Management", expanded=False):
+    with st.expander("📄 PDF Management", expanded=False):
         st.subheader("Add PDF to this Chat")
         
         uploaded_file = st.file_uploader("Upload a new PDF", type=["pdf"], key=f"pdf_uploader_{idx}")
@@ -298,9 +270,16 @@ def show_pdf_manager_in_sidebar(state):
             processed_pdf_names = [os.path.basename(p) for p in state.chat_pdf_paths[idx]]
             if uploaded_file.name not in processed_pdf_names:
                 with st.spinner(f"Processing '{uploaded_file.name}'..."):
-                    handle_pdf_upload(state.username, uploaded_file, idx)
+                    file_path = handle_pdf_upload(state.username, uploaded_file, idx)
                     save_user_data_from_session(state.username)
-                st.success(f"✅ PDF '{uploaded_file.name}' added.")
+                    # Index the new PDF now and make it the active one for this chat.
+                    ok, msg = engine.attach_pdf(file_path)
+                if ok:
+                    # Pre-generate quiz questions in the background while the user keeps chatting.
+                    start_bank_fill(file_path, state.config, rag=engine.rag)
+                    st.success(f"✅ PDF '{uploaded_file.name}' added.")
+                else:
+                    st.error(msg)
                 st.rerun()
 
         st.markdown("---")
@@ -362,12 +341,34 @@ def sidebar_navigation():
 
 # --- Main Page UI ---
 
+@traced("ui.stream_response")
 def stream_response(response):
     """Yields words from a response string with a delay to simulate typing."""
     for word in response.split():
         yield word + " "
         time.sleep(0.05)
 
+@st.fragment
+@timed("chat_transcript")
+def show_chat_transcript(chat_index):
+    """
+    Renders the loaded messages of a chat. As a fragment, it is not redrawn by
+    interactions in the sidebar fragments, and "load older" reruns only itself.
+    """
+    history = st.session_state.chat_sessions[chat_index]
+    if not history:
+        welcome_message()
+
+    # Only the most recent window of messages is loaded; older ones are fetched on request.
+    if history.has_older:
+        if st.button("⬆️ Load older messages", key=f"load_older_{chat_index}", use_container_width=True):
+            history.load_older()
+            st.rerun(scope="fragment")
+
+    for msg in history:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
 def show_chat_page(state):
     """Renders the main chat interface, including messages and input controls."""
     if state.current_chat >= len(state.chat_engines):
@@ -376,15 +377,10 @@ def show_chat_page(state):
     chat_index = state.current_chat
     chat_engine = state.chat_engines[chat_index]
 
-    if not state.chat_sessions[chat_index]:
-        welcome_message()
-
-    for msg in state.chat_sessions[chat_index]:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
+    show_chat_transcript(chat_index)
 
     if user_input := st.chat_input("Type your message here..."):
-        state.chat_sessions[chat_index].append({"role": "user", "content": user_input})
+        append_chat_message(state.username, chat_index, {"role": "user", "content": user_input})
         st.rerun()
 
     if state.chat_sessions[chat_index] and state.chat_sessions[chat_index][-1]["role"] == "user":
@@ -394,10 +390,11 @@ def show_chat_page(state):
             
             st.write_stream(stream_response(response))
         
-        state.chat_sessions[chat_index].append({"role": "assistant", "content": response})
+        append_chat_message(state.username, chat_index, {"role": "assistant", "content": response})
         save_user_data_from_session(state.username)
         
         if state.config.get("elevenlabs_api"):
+            from voice import speak_text  # torch/ElevenLabs stack, loaded on first use
             speak_text(response, state.config["elevenlabs_api"])
             
         st.rerun()
@@ -408,11 +405,13 @@ def show_chat_page(state):
         if not state.recording:
             if st.button("🎙️ Start Recording", use_container_width=True):
                 state.recording = True
+                from voice import start_recording  # pyaudio/noisereduce stack, loaded on first use
                 start_recording()
                 st.toast("Recording started... Speak now!")
                 st.rerun()
         else:
             if st.button("⏹️ Stop Recording", use_container_width=True, type="primary"):
+                from voice import stop_recording, transcribe_audio
                 audio_path = stop_recording()
                 state.recording = False
                 
@@ -420,7 +419,7 @@ def show_chat_page(state):
                     transcription = transcribe_audio(audio_path, state.config["whisper_model"])
                 
                 if transcription:
-                    state.chat_sessions[chat_index].append({"role": "user", "content": transcription})
+                    append_chat_message(state.username, chat_index, {"role": "user", "content": transcription})
                     st.rerun()
                 else:
                     st.warning("Could not transcribe audio. Please try again.")
@@ -456,6 +455,17 @@ def show_settings_page(state):
             key="whisper_model_settings"
         )
     
+    with st.container(border=True):
+        st.header("PDF Context Budget")
+        state.config["context_token_budget"] = st.number_input(
+            "Maximum tokens of PDF context sent with each question. Smaller budgets give faster replies.",
+            min_value=200,
+            max_value=4000,
+            step=100,
+            value=int(state.config.get("context_token_budget", DEFAULT_CONTEXT_TOKEN_BUDGET)),
+            key="context_token_budget_settings"
+        )
+
     with st.container(border=True):
         st.header("ElevenLabs API Key")
         state.config["elevenlabs_api"] = st.text_input(
@@ -470,6 +480,30 @@ def show_settings_page(state):
         st.success("✅ Settings saved successfully.")
         st.toast("Settings have been updated!")
 
+    with st.expander("⏱️ Script Run Times"):
+        st.caption("Recent run times of the whole script and of each independently rerunning region, across all users.")
+        summary = run_time_summary()
+        if summary:
+            st.dataframe(
+                [{"region": label, **stats} for label, stats in sorted(summary.items())],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.caption("No runs recorded yet.")
+
+    with st.expander("🔥 Startup Warm-up"):
+        st.caption("Models and MetaAI clients preloaded in the background when the app started.")
+        status = warmup_status()
+        if status:
+            st.dataframe(
+                [{"component": name, **fields} for name, fields in status.items()],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.caption("Warm-up is disabled.")
+
 
 def show_quiz_page(state):
     """Renders the quiz generation page and handles quiz logic."""
@@ -507,23 +541,38 @@ def show_quiz_page(state):
                     if pdf_path:
                         source_input_valid = True
             if st.button("✨ Generate Quiz", use_container_width=True, type="primary", disabled=not source_input_valid):
-                generator = QuizGenerator(state.config)
-                with st.spinner("Generating your quiz... This may take a moment."):
-                    if source_type == "Topic":
-                        response = generator.generate_from_topic(topic, difficulty, num_questions)
-                    else:
-                        response = generator.generate_from_pdf(pdf_path, difficulty, num_questions)
-                try:
-                    cleaned_str = response.strip().lstrip("```json").rstrip("```").strip()
-                    quiz_data = json.loads(cleaned_str)
-                    if quiz_data and all('question' in q for q in quiz_data):
-                        st.session_state.quiz_data = quiz_data
-                        st.rerun()
-                    else:
-                        st.error("The AI returned an invalid quiz format. Please try again.", icon="🚨")
-                except (json.JSONDecodeError, TypeError):
-                    st.error("Failed to parse the quiz from the AI's response.", icon="🚨")
-                    st.code(response)
+                quiz_data = []
+                if source_type == "PDF":
+                    # Hashed once per click: the bank is looked up and, after live generation, filled by it.
+                    doc_hash = file_content_hash(pdf_path)
+                    # Serve unseen questions from the pre-generated bank when it can cover the request.
+                    quiz_data = draw_questions(pdf_path, difficulty, num_questions, state.username, state.config, doc_hash=doc_hash) or []
+                if not quiz_data:
+                    generator = QuizGenerator(state.config, username=state.username)
+                    progress = st.progress(0.0, text="Generating your quiz... This may take a moment.")
+                    preview = st.container()
+                    try:
+                        if source_type == "Topic":
+                            question_stream = generator.stream_from_topic(topic, difficulty, num_questions)
+                        else:
+                            active_rag = state.chat_engines[state.current_chat].rag
+                            question_stream = generator.stream_from_pdf(pdf_path, difficulty, num_questions, rag=active_rag)
+                        # Show each question as soon as it has been parsed and validated.
+                        for question in question_stream:
+                            quiz_data.append(question)
+                            progress.progress(len(quiz_data) / num_questions, text=f"Generated {len(quiz_data)} of {num_questions} questions...")
+                            preview.markdown(f"**Question {len(quiz_data)}:** {question['question']}")
+                    except Exception as e:
+                        st.error(f"Error generating quiz: {e}", icon="🚨")
+                    if quiz_data and source_type == "PDF":
+                        add_questions(pdf_path, difficulty, quiz_data, state.username, doc_hash=doc_hash)
+                if quiz_data:
+                    if len(quiz_data) < num_questions:
+                        st.toast(f"Only {len(quiz_data)} of {num_questions} questions could be generated.", icon="⚠️")
+                    st.session_state.quiz_data = quiz_data
+                    st.rerun()
+                else:
+                    st.error("The AI did not return any valid quiz questions. Please try again.", icon="🚨")
 
     if st.session_state.get('quiz_data') and not st.session_state.get('show_score'):
         with st.container(border=True):
@@ -575,8 +624,15 @@ def show_quiz_page(state):
                             del st.session_state[key]
                     st.rerun()
             with col3:
-                pdf_data = create_quiz_pdf(st.session_state.quiz_data)
-                st.download_button(label="📄 Download PDF", data=pdf_data, file_name="quiz_with_answers.pdf", mime="application/pdf", use_container_width=True)
+                # Render the PDF only once it is asked for; identical quizzes reuse the cached render.
+                pdf_data = get_cached_quiz_pdf(st.session_state.quiz_data)
+                if pdf_data is None:
+                    if st.button("📄 Prepare PDF", use_container_width=True):
+                        with st.spinner("Rendering PDF..."):
+                            render_quiz_pdf(st.session_state.quiz_data)
+                        st.rerun()
+                else:
+                    st.download_button(label="📄 Download PDF", data=pdf_data, file_name="quiz_with_answers.pdf", mime="application/pdf", use_container_width=True)
 
 def welcome_message():
     """Displays a welcome message in the main chat area."""
@@ -1,50 +1,106 @@
+import hashlib
 import json
 import os
 import shutil
 import streamlit as st
+from persistence import WriteBehindStore
+from metrics import traced
 from chat_engine import ChatEngine
+from chat_history import ChatHistory, new_chat_id
+from chat_archive import list_archived, archive_chat, restore_chat
+from chat_search import index_message, ensure_chat_indexed, mark_chat_indexed, delete_chat_from_index
 
 # --- Constants ---
 CHATS_FILE = "user_chats.json"
 UPLOADS_DIR = "user_uploads"
 
+# Chat metadata is written behind the UI: saves are queued and coalesced into one atomic write.
+_store = WriteBehindStore(CHATS_FILE)
+
 # --- Helper Functions ---
 
 def get_default_user_data():
     """Returns the default data structure for a new user."""
     return {
-        "chat_sessions": [[]],
+        "chat_ids": [new_chat_id()],
         "chat_session_names": ["New Chat"],
         "chat_pdf_paths": [[]],
-        "archived_sessions": [], 
     }
 
 # --- Main Data Functions ---
 
 def load_all_user_data():
-    """Loads all user chat data from the main JSON file."""
-    if not os.path.exists(CHATS_FILE):
-        return {}
-    try:
-        with open(CHATS_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {}
+    """Loads all user chat data, including saves that haven't been written to disk yet."""
+    return _store.read_all()
+
+def flush_user_data():
+    """Writes any queued user data to disk now, e.g. on logout."""
+    _store.flush()
+
+def _migrate_inline_sessions(username, user_data):
+    """
+    Moves messages stored inline in user_chats.json (the old format) into
+    per-chat history files, and returns the new chat ids.
+    """
+    chat_ids = []
+    for messages in user_data.get("chat_sessions", []):
+        chat_id = new_chat_id()
+        ChatHistory(username, chat_id).extend(messages)
+        chat_ids.append(chat_id)
+    return chat_ids
 
-def save_all_user_data(all_data):
-    """Saves all user chat data to the main JSON file."""
-    with open(CHATS_FILE, 'w') as f:
-        json.dump(all_data, f, indent=4)
+def _inline_archive_id(position, archived):
+    """
+    Returns a chat id for an archived chat stored inline, derived from its
+    place in the list, name and messages, so every run picks the same one.
+    """
+    content = json.dumps([position, archived.get("name"), archived.get("session", [])], sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+def _move_archives_to_cold_storage(username, archived_sessions):
+    """
+    Moves archived chats still listed in user_chats.json (older formats) into
+    compressed cold storage, indexing them for search on the way. Chats already
+    in the archive manifest, e.g. from a run interrupted before the metadata
+    was saved, are skipped.
+    """
+    archived_ids = {entry["chat_id"] for entry in list_archived(username)}
+    for position, archived in enumerate(archived_sessions):
+        chat_id = archived.get("chat_id") or _inline_archive_id(position, archived)
+        if chat_id in archived_ids:
+            continue
+        if archived.get("chat_id") is None:
+            # Messages stored inline: write them out as a history file first,
+            # replacing any partial copy left by an interrupted run.
+            history = ChatHistory(username, chat_id)
+            history.delete()
+            history.extend(archived.get("session", []))
+        ensure_chat_indexed(username, chat_id, ChatHistory(username, chat_id).read_all)
+        archive_chat(username, chat_id, archived["name"], archived.get("pdfs", []))
 
 def load_user_data_into_session(username):
     """Loads a specific user's data into the Streamlit session state."""
     all_data = load_all_user_data()
     user_data = all_data.get(username, get_default_user_data())
 
-    st.session_state.chat_sessions = user_data.get("chat_sessions", [[]])
+    migrated = "chat_ids" not in user_data
+    if migrated:
+        user_data["chat_ids"] = _migrate_inline_sessions(username, user_data) or [new_chat_id()]
+
+    # Messages stay on disk; each history reads its most recent window only when the chat is opened.
+    st.session_state.chat_ids = user_data["chat_ids"]
+    st.session_state.chat_sessions = [ChatHistory(username, chat_id) for chat_id in st.session_state.chat_ids]
     st.session_state.chat_session_names = user_data.get("chat_session_names", ["New Chat"])
     st.session_state.chat_pdf_paths = user_data.get("chat_pdf_paths", [[]])
-    st.session_state.archived_sessions = user_data.get("archived_sessions", [])
+    # Archived chats live in cold storage and are only read when the archive is opened.
+    st.session_state.archived_sessions = None
+    if user_data.get("archived_sessions"):
+        _move_archives_to_cold_storage(username, user_data["archived_sessions"])
+        migrated = True
+
+    # Index any active chats whose history predates the search index.
+    for chat_id in st.session_state.chat_ids:
+        ensure_chat_indexed(username, chat_id, ChatHistory(username, chat_id).read_all)
 
     num_sessions = len(st.session_state.chat_sessions)
     st.session_state.chat_session_names.extend(["New Chat"] * (num_sessions - len(st.session_state.chat_session_names)))
@@ -52,32 +108,46 @@ def load_user_data_into_session(username):
 
     st.session_state.chat_engines = []
     for pdf_list in st.session_state.chat_pdf_paths:
-        engine = ChatEngine(st.session_state.config)
+        engine = ChatEngine(st.session_state.config, username=st.session_state.username)
         if pdf_list and os.path.exists(pdf_list[0]):
             engine.attach_pdf(pdf_list[0])
         st.session_state.chat_engines.append(engine)
     
     if not st.session_state.chat_engines:
-        st.session_state.chat_sessions = [[]]
+        st.session_state.chat_ids = [new_chat_id()]
+        st.session_state.chat_sessions = [ChatHistory(username, st.session_state.chat_ids[0])]
+        mark_chat_indexed(username, st.session_state.chat_ids[0])
         st.session_state.chat_session_names = ["New Chat"]
         st.session_state.chat_pdf_paths = [[]]
-        st.session_state.chat_engines.append(ChatEngine(st.session_state.config))
+        st.session_state.chat_engines.append(ChatEngine(st.session_state.config, username=st.session_state.username))
 
     st.session_state.current_chat = 0
 
+    if migrated:
+        # Record the migrated data on disk right away so the migration never runs twice.
+        save_user_data_from_session(username)
+        flush_user_data()
+
+@traced("persistence.save")
 def save_user_data_from_session(username):
-    """Saves the current user's session data to the main JSON file."""
+    """
+    Queues the current user's session data to be saved to the main JSON file.
+    Returns immediately; the write happens on a background thread.
+    """
     if not username:
         return
 
-    all_data = load_all_user_data()
-    all_data[username] = {
-        "chat_sessions": st.session_state.get("chat_sessions", [[]]),
+    # Messages are persisted by ChatHistory as they are appended; only chat metadata is saved here.
+    _store.put(username, {
+        "chat_ids": st.session_state.get("chat_ids", []),
         "chat_session_names": st.session_state.get("chat_session_names", ["New Chat"]),
         "chat_pdf_paths": st.session_state.get("chat_pdf_paths", [[]]),
-        "archived_sessions": st.session_state.get("archived_sessions", []),
-    }
-    save_all_user_data(all_data)
+    })
+
+def append_chat_message(username, chat_index, message):
+    """Appends a message to a chat's history and adds it to the search index."""
+    st.session_state.chat_sessions[chat_index].append(message)
+    index_message(username, st.session_state.chat_ids[chat_index], message)
 
 def handle_pdf_upload(username, uploaded_file, chat_index):
     """Saves an uploaded PDF to a user-specific directory and returns its path."""
@@ -109,11 +179,14 @@ def delete_pdf_for_user(pdf_path_to_delete):
 
 def create_new_chat_session(username):
     """Appends a new, empty chat session to the session state and saves."""
-    st.session_state.chat_sessions.append([])
+    chat_id = new_chat_id()
+    st.session_state.chat_ids.append(chat_id)
+    st.session_state.chat_sessions.append(ChatHistory(username, chat_id))
+    mark_chat_indexed(username, chat_id)
     new_chat_name = f"Chat {len(st.session_state.chat_sessions) + 1}"
     st.session_state.chat_session_names.append(new_chat_name)
     st.session_state.chat_pdf_paths.append([])
-    st.session_state.chat_engines.append(ChatEngine(st.session_state.config))
+    st.session_state.chat_engines.append(ChatEngine(st.session_state.config, username=st.session_state.username))
     st.session_state.current_chat = len(st.session_state.chat_sessions) - 1
     save_user_data_from_session(username)
 
@@ -130,6 +203,9 @@ def delete_chat_session(username, chat_index):
             except OSError as e:
                 print(f"Error deleting file {pdf_path}: {e}")
 
+    st.session_state.chat_sessions[chat_index].delete()
+    delete_chat_from_index(username, st.session_state.chat_ids[chat_index])
+    st.session_state.chat_ids.pop(chat_index)
     st.session_state.chat_sessions.pop(chat_index)
     st.session_state.chat_session_names.pop(chat_index)
     st.session_state.chat_pdf_paths.pop(chat_index)
@@ -137,21 +213,28 @@ def delete_chat_session(username, chat_index):
     
     save_user_data_from_session(username)
 
+def get_archived_sessions(username):
+    """Returns the user's archived chats, reading the cold storage manifest on first use."""
+    if st.session_state.get("archived_sessions") is None:
+        st.session_state.archived_sessions = list_archived(username)
+    return st.session_state.archived_sessions
+
 def archive_chat_session(username, chat_index):
-    """Moves a chat from the active list to the archive list."""
+    """Moves a chat from the active list to compressed cold storage."""
     if not (0 <= chat_index < len(st.session_state.chat_session_names)):
         return
-        
-    archived_chat = {
-        "session": st.session_state.chat_sessions[chat_index],
-        "name": st.session_state.chat_session_names[chat_index],
-        "pdfs": st.session_state.chat_pdf_paths[chat_index],
-    }
-    
-    if "archived_sessions" not in st.session_state:
-        st.session_state.archived_sessions = []
-    st.session_state.archived_sessions.append(archived_chat)
+
+    archived_chat = archive_chat(
+        username,
+        st.session_state.chat_ids[chat_index],
+        st.session_state.chat_session_names[chat_index],
+        st.session_state.chat_pdf_paths[chat_index],
+    )
+    # Keep the archive list in sync only if it has been loaded this session.
+    if st.session_state.get("archived_sessions") is not None:
+        st.session_state.archived_sessions.append(archived_chat)
     
+    st.session_state.chat_ids.pop(chat_index)
     st.session_state.chat_sessions.pop(chat_index)
     st.session_state.chat_session_names.pop(chat_index)
     st.session_state.chat_pdf_paths.pop(chat_index)
@@ -160,20 +243,24 @@ def archive_chat_session(username, chat_index):
     save_user_data_from_session(username)
 
 def restore_chat_session(username, archive_index):
-    """Moves a chat from the archive back to the active list."""
-    if not (0 <= archive_index < len(st.session_state.archived_sessions)):
+    """Moves a chat from cold storage back to the active list."""
+    archived_sessions = get_archived_sessions(username)
+    if not (0 <= archive_index < len(archived_sessions)):
         return
 
-    # Pop the archived chat from the list
-    restored_chat = st.session_state.archived_sessions.pop(archive_index)
+    # Pop the archived chat from the list and bring its history back to hot storage
+    restored_chat = archived_sessions.pop(archive_index)
+    restore_chat(username, restored_chat["chat_id"])
     
     # Append its data to the active session lists
-    st.session_state.chat_sessions.append(restored_chat["session"])
+    chat_id = restored_chat["chat_id"]
+    st.session_state.chat_ids.append(chat_id)
+    st.session_state.chat_sessions.append(ChatHistory(username, chat_id))
     st.session_state.chat_session_names.append(restored_chat["name"])
     st.session_state.chat_pdf_paths.append(restored_chat["pdfs"])
     
     # Re-create the chat engine for the restored chat
-    engine = ChatEngine(st.session_state.config)
+    engine = ChatEngine(st.session_state.config, username=st.session_state.username)
     if restored_chat["pdfs"] and os.path.exists(restored_chat["pdfs"][0]):
         engine.attach_pdf(restored_chat["pdfs"][0])
     st.session_state.chat_engines.append(engine)
@@ -182,4 +269,4 @@ def restore_chat_session(username, archive_index):
     st.session_state.current_chat = len(st.session_state.chat_sessions) - 1
     
     # Save the changes
-    save_user_data_from_session(username)
\ No newline at end of file
+    save_user_data_from_session(username)
@@ -0,0 +1,126 @@
+# vector_index.py
+
+import json
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+# --- Constants ---
+INDEX_META_FILE = "index_meta.json"
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivf_pq")
+
+# Corpus sizes (in chunks) at which "auto" switches to the next index type.
+HNSW_MIN_CHUNKS = 20_000
+IVF_MIN_CHUNKS = 200_000
+IVF_PQ_MIN_CHUNKS = 1_000_000
+
+# Search-time parameters. These trade recall for latency and are persisted
+# with the index so a reloaded index behaves exactly like the one we built.
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+PQ_BITS = 8
+
+# --- Index Selection ---
+
+def choose_index_type(num_chunks):
+    """Picks an index type for a corpus of the given size."""
+    if num_chunks >= IVF_PQ_MIN_CHUNKS:
+        return "ivf_pq"
+    if num_chunks >= IVF_MIN_CHUNKS:
+        return "ivf"
+    if num_chunks >= HNSW_MIN_CHUNKS:
+        return "hnsw"
+    return "flat"
+
+def _ivf_nlist(num_vectors):
+    """Number of IVF cells: ~4*sqrt(n), keeping at least 39 training points per cell."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+def _pq_subquantizers(dim):
+    """Largest common sub-quantizer count that evenly divides the embedding size."""
+    for m in (64, 48, 32, 16, 8, 4, 2, 1):
+        if dim % m == 0:
+            return m
+    return 1
+
+# --- Index Construction ---
+
+def build_index(embeddings, index_type="auto"):
+    """
+    Builds, trains and fills a FAISS index for the given embedding matrix.
+
+    Returns the index together with a metadata dict describing how it was built,
+    which should be saved next to the index with `save_index_meta`.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    num_vectors, dim = embeddings.shape
+
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES} or 'auto'.")
+
+    # IVF variants need enough points to train their quantizers.
+    if index_type == "ivf_pq" and num_vectors < 39 * (1 << PQ_BITS):
+        logging.warning(f"Too few chunks ({num_vectors}) to train IVF-PQ; using IVF instead.")
+        index_type = "ivf"
+    if index_type == "ivf" and num_vectors < 39:
+        logging.warning(f"Too few chunks ({num_vectors}) to train IVF; using a flat index instead.")
+        index_type = "flat"
+
+    meta = {"index_type": index_type, "dim": dim, "num_vectors": num_vectors}
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        meta.update({"M": HNSW_M, "ef_search": HNSW_EF_SEARCH})
+    else:
+        nlist = _ivf_nlist(num_vectors)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            m = _pq_subquantizers(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, PQ_BITS)
+            meta.update({"pq_m": m, "pq_bits": PQ_BITS})
+        index.train(embeddings)
+        meta.update({"nlist": nlist, "nprobe": min(IVF_NPROBE, nlist)})
+
+    index.add(embeddings)
+    configure_search(index, meta)
+    return index, meta
+
+def configure_search(index, meta):
+    """Applies the persisted search-time parameters to a (re)loaded index."""
+    index_type = meta.get("index_type", "flat")
+    if index_type == "hnsw":
+        index.hnsw.efSearch = meta.get("ef_search", HNSW_EF_SEARCH)
+    elif index_type in ("ivf", "ivf_pq"):
+        index.nprobe = meta.get("nprobe", IVF_NPROBE)
+        # Lets stored vectors be read back by position (used for MMR when packing context).
+        index.make_direct_map()
+
+# --- Metadata Persistence ---
+
+def save_index_meta(index_path, meta):
+    """Writes the index metadata next to the saved FAISS index."""
+    with open(os.path.join(index_path, INDEX_META_FILE), 'w') as f:
+        json.dump(meta, f, indent=4)
+
+def load_index_meta(index_path):
+    """Reads the index metadata. Indexes saved before it existed are flat."""
+    meta_path = os.path.join(index_path, INDEX_META_FILE)
+    if not os.path.exists(meta_path):
+        return {"index_type": "flat"}
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {"index_type": "flat"}
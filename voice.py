@@ -1,3 +1,5 @@
+import os
+import threading
 import wave
 import pyaudio
 import streamlit as st
@@ -6,6 +8,19 @@ import numpy as np
 import noisereduce as nr
 from elevenlabs import ElevenLabs, stream as el_stream
 from faster_whisper import WhisperModel
+from metrics import traced
+
+# --- Text-to-Speech Settings ---
+# Set ELEVENLABS_BASE_URL to send text-to-speech to another endpoint, e.g. a local stand-in,
+# and DIALOGIX_TTS_PLAYBACK=0 to download the audio without playing it (headless benchmarks).
+ELEVENLABS_BASE_URL_ENV = "ELEVENLABS_BASE_URL"
+TTS_PLAYBACK_ENV = "DIALOGIX_TTS_PLAYBACK"
+
+# --- Whisper Models ---
+# Loaded once per model name and device and shared by every session (and the startup warm-up).
+_whisper_lock = threading.Lock()
+_whisper_load_locks = {}
+_whisper_models = {}
 
 # --- Recording State ---
 audio_frames = []
@@ -74,17 +89,33 @@ def stop_recording(filename="voice_record.wav"):
         record_thread.join()
     return filename
 
+def whisper_device():
+    """Returns the device Whisper runs on: the GPU when there is one."""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def get_whisper_model(model_name="tiny"):
+    """Returns the process-wide Whisper model for a name, loading it on first use."""
+    key = (model_name, whisper_device())
+    with _whisper_lock:
+        load_lock = _whisper_load_locks.setdefault(key, threading.Lock())
+    # Loading takes a while, so only callers of the same model wait for it; others go ahead.
+    with load_lock:
+        if key not in _whisper_models:
+            # int8 for better performance on CPU
+            _whisper_models[key] = WhisperModel(key[0], device=key[1], compute_type="int8")
+        return _whisper_models[key]
+
+@traced("voice.transcribe")
 def transcribe_audio(path, model_name="tiny"):
     """
     Transcribes the audio file using faster-whisper.
     Now includes Voice Activity Detection (VAD) to ignore non-speech segments.
     """
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    st.markdown(f"🛠️ Using Whisper model: `{model_name}` on `{device}`")
+    st.markdown(f"🛠️ Using Whisper model: `{model_name}` on `{whisper_device()}`")
 
     try:
-        # Load the model (using int8 for better performance on CPU)
-        model = WhisperModel(model_name, device=device, compute_type="int8")
+        # Loaded once per process, usually already by the startup warm-up
+        model = get_whisper_model(model_name)
 
         # --- OPTIMIZATION 2: Voice Activity Detection (VAD) ---
         # Transcribe with VAD filter enabled to only process speech segments
@@ -101,19 +132,25 @@ def transcribe_audio(path, model_name="tiny"):
         st.error(f"Error during transcription: {e}")
         return ""
 
+@traced("voice.speak_text")
 def speak_text(response_text, api_key):
     """Converts text to speech using ElevenLabs API."""
     if not api_key:
         st.warning("🔇 ElevenLabs API key not set.")
         return
     try:
-        client = ElevenLabs(api_key=api_key)
+        base_url = os.environ.get(ELEVENLABS_BASE_URL_ENV)
+        client = ElevenLabs(api_key=api_key, base_url=base_url) if base_url else ElevenLabs(api_key=api_key)
         audio_stream = client.text_to_speech.stream(
             text=response_text,
             voice_id="JNaMjd7t4u3EhgkVknn3",  # This is the corrected line
             model_id="eleven_multilingual_v2"
         )
-        el_stream(audio_stream)
+        if os.environ.get(TTS_PLAYBACK_ENV, "1") == "0":
+            for _ in audio_stream:
+                pass
+        else:
+            el_stream(audio_stream)
 
     except Exception as e:
         st.error(f"🛑 TTS Error: {e}")
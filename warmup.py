@@ -0,0 +1,97 @@
+# warmup.py
+
+import logging
+import os
+import threading
+import time
+from config import load_config
+from metrics import register_collector, span
+
+# --- Constants ---
+# Set to 0 to skip the warm-up, e.g. when running one-off scripts or tests.
+WARMUP_ENV = "DIALOGIX_WARMUP"
+# MetaAI clients to prepare for the first chats after a deploy.
+WARM_META_AI_CLIENTS = 2
+
+PENDING, RUNNING, READY, FAILED = "pending", "running", "ready", "failed"
+
+_lock = threading.Lock()
+_status = {}
+_started = False
+
+# --- Warm-up Tasks ---
+# Each task loads into the same process-wide caches the app uses, so the first
+# user gets the already loaded model or client instead of paying for it.
+
+def _warm_embedding_model(config):
+    from embedding_cache import get_embedding_model
+    get_embedding_model()
+
+def _warm_whisper_model(config):
+    from voice import get_whisper_model
+    get_whisper_model(config.get("whisper_model", "tiny"))
+
+def _warm_meta_ai(config):
+    from chat_engine import prime_meta_ai_clients
+    prime_meta_ai_clients(WARM_META_AI_CLIENTS)
+
+WARMUP_TASKS = {
+    "embedding_model": _warm_embedding_model,
+    "whisper_model": _warm_whisper_model,
+    "meta_ai": _warm_meta_ai,
+}
+
+def _set_status(name, **fields):
+    with _lock:
+        _status[name].update(fields)
+
+def _run_task(name, task, config):
+    _set_status(name, state=RUNNING)
+    start = time.perf_counter()
+    try:
+        with span(f"warmup.{name}"):
+            task(config)
+        _set_status(name, state=READY, seconds=round(time.perf_counter() - start, 2))
+    except Exception as e:
+        # A failed warm-up only means the first user loads it instead.
+        logging.exception(f"Warm-up of {name} failed")
+        _set_status(name, state=FAILED, seconds=round(time.perf_counter() - start, 2), error=str(e))
+
+# --- Public API ---
+
+def start_warmup(config=None):
+    """
+    Starts warming up the models and clients in the background, once per
+    process; later calls (e.g. on every Streamlit rerun) do nothing. Tasks run
+    on their own daemon threads, so the login page never waits for them.
+    The config is read from disk when not given, on the first call only.
+    """
+    global _started
+    with _lock:
+        if _started or os.environ.get(WARMUP_ENV, "1") == "0":
+            return
+        _started = True
+        for name in WARMUP_TASKS:
+            _status[name] = {"state": PENDING, "seconds": None, "error": None}
+    if config is None:
+        config = load_config()
+    for name, task in WARMUP_TASKS.items():
+        threading.Thread(target=_run_task, args=(name, task, dict(config)), name=f"warmup-{name}", daemon=True).start()
+
+def warmup_status():
+    """Returns {task: {"state", "seconds", "error"}} for every warm-up task."""
+    with _lock:
+        return {name: dict(status) for name, status in _status.items()}
+
+def is_ready(name=None):
+    """Whether one task, or every task when no name is given, has finished successfully."""
+    status = warmup_status()
+    if name is not None:
+        return status.get(name, {}).get("state") == READY
+    return bool(status) and all(s["state"] == READY for s in status.values())
+
+def _readiness_counters():
+    """Exports each task's readiness (1 when ready) alongside the other metrics."""
+    return {f"warmup.{name}.ready": int(s["state"] == READY) for name, s in warmup_status().items()}
+
+register_collector(_readiness_counters)